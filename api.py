@@ -1,16 +1,175 @@
 import os
+import json
+import threading
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from flask import request
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, jsonify, render_template, stream_with_context
+import text_analysis
 from text_analysis import TextAnalysis
 from spell_checker import SpellChecker
-from speech_to_text import SpeechToText
-from classifiers import Classifiers
+from document import TokenizedDocument
+from speech_to_text import SpeechToText, GoogleCloudBackend, SphinxBackend
+from model_registry import registry
+from jobs import JobQueue, QueueFull
+from resources import resources
+from result_cache import ResultCache, text_digest, file_digest
+from uploads import UploadStore, UploadTooLarge
 from werkzeug.utils import secure_filename
-from utils import logger_exception, tokenize
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+from utils import logger_exception, tokenize, iter_json_array
+from metrics import metrics, profiler
 
 
 app = Flask(__name__, template_folder='static/templates')
-app.config['UPLOAD_FOLDER'] = '/tmp/'
+# directory of uploaded files stored by hash of content and max size of uploaded file,
+# bigger requests are rejected before they are read
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', '/tmp/uploads')
+app.config['UPLOAD_MAX_SIZE'] = int(os.environ.get('UPLOAD_MAX_SIZE', 100 << 20))
+# leave room for headers of multipart form
+app.config['MAX_CONTENT_LENGTH'] = app.config['UPLOAD_MAX_SIZE'] + (1 << 16)
+# load NLTK resources, models and spelling dictionary on start instead of on first request
+app.config['PRELOAD'] = os.environ.get('PRELOAD', '0') == '1'
+# number of processes used by text analysis of big texts, 1 disables parallel analysis
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 1))
+# number of results cached in memory and optional directory of results cached on disk
+app.config['RESULT_CACHE_SIZE'] = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR')
+
+# database of jobs queue, number of jobs run at the same time and max number of not finished jobs
+app.config['JOBS_DB'] = os.environ.get('JOBS_DB', 'jobs.sqlite3')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_MAX_PENDING'] = int(os.environ.get('JOB_MAX_PENDING', 100))
+# max number of seconds of long polling of job
+app.config['JOB_MAX_WAIT'] = 60
+# number of documents of batch request processed together
+app.config['BATCH_SIZE'] = int(os.environ.get('BATCH_SIZE', 64))
+# speech recognition backend: google (Google Cloud Speech) or sphinx (offline),
+# and number of audio chunks recognized at the same time
+app.config['SPEECH_BACKEND'] = os.environ.get('SPEECH_BACKEND', 'google')
+app.config['SPEECH_WORKERS'] = int(os.environ.get('SPEECH_WORKERS', 4))
+# index of spelling candidates (delete or trie) and max edit distance of candidates,
+# trie index supports distances above 2
+app.config['SPELL_CHECK_INDEX'] = os.environ.get('SPELL_CHECK_INDEX', 'delete')
+app.config['SPELL_CHECK_MAX_DISTANCE'] = int(os.environ.get('SPELL_CHECK_MAX_DISTANCE', 2))
+# rank spelling corrections by bigram language model of dictionary text
+app.config['SPELL_CHECK_CONTEXT'] = os.environ.get('SPELL_CHECK_CONTEXT', '0') == '1'
+# profile requests slower than that number of seconds, profiler is disabled when not set
+app.config['PROFILE_SLOW_REQUESTS'] = os.environ.get('PROFILE_SLOW_REQUESTS')
+
+SENTIMENT_MODELS = ['naive_best_words', 'naive_bag_of_words', 'svm']
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+
+cache_requests = metrics.counter('result_cache_requests_total', 'Lookups of result cache by status', ('status', ))
+result_cache = ResultCache(app.config['RESULT_CACHE_SIZE'], app.config['RESULT_CACHE_DIR'])
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_MAX_SIZE'])
+
+spell_checker_lock = threading.Lock()
+spell_checker = None
+
+
+def get_spell_checker():
+    """
+    Spell checker shared by all requests of worker.
+    Dictionary and index of candidates are built only once.
+    """
+    global spell_checker
+    if spell_checker is None:
+        with spell_checker_lock:
+            if spell_checker is None:
+                spell_checker = SpellChecker(
+                    index_type=app.config['SPELL_CHECK_INDEX'], max_distance=app.config['SPELL_CHECK_MAX_DISTANCE']
+                )
+    return spell_checker
+
+
+analysis_executor_lock = threading.Lock()
+analysis_executor = None
+
+
+def get_analysis_executor():
+    """
+    Process pool shared by text analysis requests
+    :return: ProcessPoolExecutor or None if parallel analysis is disabled
+    """
+    global analysis_executor
+    if app.config['ANALYSIS_WORKERS'] < 2:
+        return None
+    if analysis_executor is None:
+        with analysis_executor_lock:
+            if analysis_executor is None:
+                analysis_executor = ProcessPoolExecutor(app.config['ANALYSIS_WORKERS'])
+    return analysis_executor
+
+
+job_queue_lock = threading.Lock()
+job_queue = None
+
+
+def get_job_queue():
+    """
+    Queue of jobs run by this worker
+    :return: JobQueue
+    """
+    global job_queue
+    if job_queue is None:
+        with job_queue_lock:
+            if job_queue is None:
+                queue = JobQueue(app.config['JOBS_DB'], app.config['JOB_WORKERS'], app.config['JOB_MAX_PENDING'])
+                queue.register('speech_to_text', speech_to_text_job)
+                queue.register('text_analysis', text_analysis_job)
+                queue.register('spell_check', spell_check_job)
+                queue.recover()
+                job_queue = queue
+    return job_queue
+
+
+def speech_to_text():
+    """
+    Speech recognizer with configured backend
+    :return: SpeechToText
+    """
+    backend = SphinxBackend() if app.config['SPEECH_BACKEND'] == 'sphinx' else GoogleCloudBackend()
+    return SpeechToText(backend=backend, workers=app.config['SPEECH_WORKERS'])
+
+
+def speech_to_text_job(payload):
+    recognizer = speech_to_text()
+    text = recognizer.recognize(audio_file=payload['path'])
+    return {'text': text, 'chunks': recognizer.timings}
+
+
+def text_analysis_job(payload):
+    analyzer = TextAnalysis(filepath=payload['path'], streaming=True)
+    return analyzer.analyze(executor=get_analysis_executor())
+
+
+def spell_check_job(payload):
+    return get_spell_checker().check_file(payload['path'], executor=get_analysis_executor())
+
+
+def preload():
+    """
+    Load all resources and models used by requests
+    """
+    with resources.timed('preload'):
+        resources.preload()
+        with resources.timed('models'):
+            registry.preload()
+        with resources.timed('spell_checker'):
+            get_spell_checker().index
+
+
+def after_fork():
+    """
+    Recreate state which can not be shared by processes forked after preload:
+    database connections, process and thread pools, threads
+    """
+    global upload_store, analysis_executor, job_queue
+    upload_store = UploadStore(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_MAX_SIZE'])
+    analysis_executor = None
+    job_queue = None
+    profiler.after_fork()
 
 
 @app.route('/')
@@ -18,101 +177,397 @@ def index():
     return render_template("index.html")
 
 
+def save_upload(stream, filename, content_type=None):
+    """
+    Stream uploaded file to upload store
+    :param stream: file-like object
+    :param filename: string name of file given by client
+    :param content_type: string content type of file
+    :return: dict metadata of upload
+    """
+    return upload_store.save(stream, secure_filename(filename), content_type)
+
+
+def uploaded_file(filename):
+    """
+    Find uploaded file
+    :param filename: string name of upload or hash of file
+    :return: dict metadata of upload with path or None
+    """
+    return upload_store.get(secure_filename(filename))
+
+
+def too_large_response():
+    return jsonify({'message': 'File is bigger than {} bytes'.format(app.config['UPLOAD_MAX_SIZE'])}), 413
+
+
 @app.route('/upload', methods=('POST', ))
 @logger_exception
 def upload_file():
     try:
         file = request.files.get('file')
         if file and file.filename.rsplit('.', 1)[1] in ('txt', ):
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            save_upload(file.stream, file.filename, file.mimetype)
             return jsonify('File uploaded successfully')
         return jsonify({'message': 'File format is not supported. Please use txt'}), 400
+    except (RequestEntityTooLarge, UploadTooLarge) as e:
+        return too_large_response()
     except Exception as e:
         return jsonify('Failed to upload file'), 400
 
 
+@app.route('/uploads/<filename>', methods=('PUT', ))
+@logger_exception
+def upload_raw_file(filename):
+    # body is the file itself, so it is streamed to disk without form parsing
+    try:
+        upload = save_upload(request.stream, filename, request.mimetype or None)
+    except (RequestEntityTooLarge, UploadTooLarge) as e:
+        return too_large_response()
+    upload.pop('path')
+    return jsonify(upload), 201
+
+
+@app.route('/uploads/<filename>')
+@logger_exception
+def upload_info(filename):
+    upload = uploaded_file(filename)
+    if upload is None:
+        return jsonify('File not found'), 404
+    upload.pop('path')
+    return jsonify(upload)
+
+
+@app.route('/uploads')
+@logger_exception
+def uploads_stats():
+    return jsonify(upload_store.stats())
+
+
 @app.route('/speech_to_text', methods=('POST', ))
 @logger_exception
 def get_text_from_audio():
     try:
         file = request.files.get('file')
         if file and file.filename.rsplit('.', 1)[1] in ('flac', 'wav'):
-            speech_to_text = SpeechToText()
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            text = speech_to_text.recognize(audio_file=os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            return jsonify({'text': text})
+            recognizer = speech_to_text()
+            upload = save_upload(file.stream, file.filename, file.mimetype)
+            text = recognizer.recognize(audio_file=upload['path'])
+            return jsonify({'text': text, 'chunks': recognizer.timings})
         return jsonify({'message': 'File format is not supported. Please use flac, wav'}), 400
+    except (RequestEntityTooLarge, UploadTooLarge) as e:
+        return too_large_response()
     except Exception as e:
         return jsonify('Failed to upload file'), 400
 
 
-@app.route('/<filename>/text_analysis/')
+def submit_job(kind, payload):
+    """
+    Submit job and respond with its id
+    :param kind: string kind of job
+    :param payload: dict payload of job
+    :return: response
+    """
+    try:
+        job_id = get_job_queue().submit(kind, payload)
+    except QueueFull:
+        response = jsonify({'message': 'Too many jobs are waiting. Please try again later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    response = jsonify({'id': job_id, 'status': JobQueue.QUEUED})
+    response.status_code = 202
+    response.headers['Location'] = '/jobs/{}'.format(job_id)
+    return response
+
+
+@app.route('/jobs/speech_to_text', methods=('POST', ))
 @logger_exception
-def analyze(filename):
+def speech_to_text_submit():
     try:
-        analyzer = TextAnalysis(
-            filepath=os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file = request.files.get('file')
+        if file and file.filename.rsplit('.', 1)[-1] in ('flac', 'wav'):
+            upload = save_upload(file.stream, file.filename, file.mimetype)
+            return submit_job('speech_to_text', {'path': upload['path']})
+    except (RequestEntityTooLarge, UploadTooLarge) as e:
+        return too_large_response()
+    return jsonify({'message': 'File format is not supported. Please use flac, wav'}), 400
+
+
+@app.route('/jobs/<filename>/text_analysis', methods=('POST', ))
+@logger_exception
+def analyze_submit(filename):
+    upload = uploaded_file(filename)
+    if upload is None:
+        return jsonify('File not found'), 400
+    return submit_job('text_analysis', {'path': upload['path']})
+
+
+@app.route('/jobs/<filename>/spell_check', methods=('POST', ))
+@logger_exception
+def spell_check_submit(filename):
+    upload = uploaded_file(filename)
+    if upload is None:
+        return jsonify('File not found'), 400
+    return submit_job('spell_check', {'path': upload['path']})
+
+
+@app.route('/jobs/<job_id>')
+@logger_exception
+def job_status(job_id):
+    try:
+        wait = min(float(request.args.get('wait', 0)), app.config['JOB_MAX_WAIT'])
+    except ValueError:
+        return jsonify('Wait must be a number of seconds'), 400
+    job = get_job_queue().wait(job_id, wait) if wait > 0 else get_job_queue().get(job_id)
+    if job is None:
+        return jsonify('Job not found'), 404
+    return jsonify(job)
+
+
+@app.route('/jobs')
+@logger_exception
+def jobs_stats():
+    return jsonify(get_job_queue().stats())
+
+
+def cached_response(result, cache_status, status=200):
+    """
+    JSON response with cache status header
+    :param result: JSON serializable result
+    :param cache_status: string cache status
+    :param status: int HTTP status
+    :return: response
+    """
+    cache_requests.inc(cache_status)
+    response = jsonify(result)
+    response.status_code = status
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+def sentiment_models():
+    """
+    Loaded sentiment classifiers and version of them
+    :return: tuple of dict name -> classifier and string version
+    """
+    models = {name: registry.get(name) for name in SENTIMENT_MODELS}
+    return models, registry.version(SENTIMENT_MODELS)
+
+
+def text_analysis_result(data):
+    """
+    Cached text analysis
+    :param data: string text
+    :return: tuple of result and cache status
+    """
+    analyzer = TextAnalysis(text=data)
+    return result_cache.get_or_compute(
+        'text_analysis', text_analysis.VERSION, text_digest(data),
+        lambda: analyzer.analyze(executor=get_analysis_executor())
+    )
+
+
+def spell_check_version(checker):
+    """
+    Version of spell check results
+    :param checker: SpellChecker
+    :return: string
+    """
+    return checker.version + ('-context' if app.config['SPELL_CHECK_CONTEXT'] else '')
+
+
+def spell_check_result(data):
+    """
+    Cached spell check
+    :param data: string text
+    :return: tuple of result and cache status
+    """
+    checker = get_spell_checker()
+    return result_cache.get_or_compute(
+        'spell_check', spell_check_version(checker), text_digest(data),
+        lambda: checker.correct_document(
+            data, executor=get_analysis_executor(), context=app.config['SPELL_CHECK_CONTEXT']
         )
-        return jsonify(analyzer.analyze())
-    except FileNotFoundError as e:
+    )
+
+
+def sentiment_results(texts):
+    """
+    Cached sentiment analysis of words of texts.
+    Words of all texts missing in cache are scored by every model at once.
+    :param texts: list of string texts
+    :return: list of tuples of result and cache status
+    """
+    models, version = sentiment_models()
+    results = []
+    missing = []
+    for text in texts:
+        key = result_cache.key('sentiment_analysis', version, text_digest(text))
+        result, cache_status = result_cache.get(key)
+        if result is None:
+            missing.append((len(results), key, [word for word in tokenize(text)]))
+        results.append((result, cache_status))
+    if missing:
+        words = [word for _, _, text_words in missing for word in text_words]
+        scores = {name: models[name].batch_predict_prob(words).tolist() for name in SENTIMENT_MODELS}
+        start = 0
+        for index, key, text_words in missing:
+            end = start + len(text_words)
+            result = {
+                # as BayesClassifier.predict_prob, skip words without known features
+                'naive_best_words': [p for p in scores['naive_best_words'][start:end] if p != 0.5],
+                'naive_bag_of_words': [p for p in scores['naive_bag_of_words'][start:end] if p != 0.5],
+                'svm': scores['svm'][start:end]
+            }
+            result_cache.put(key, result)
+            results[index] = (result, 'MISS')
+            start = end
+    return results
+
+
+def read_documents():
+    """
+    Documents of batch request.
+    Body is JSON array, parsed item by item, or NDJSON stream, read line by line,
+    of strings or objects with 'data' and optional 'id' (index of document by default).
+    :return: generator of (id, text), text is None for invalid document
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = (line for line in request.stream if line.strip())
+    elif not request.is_json:
+        raise UnsupportedMediaType('Batch body must be JSON or NDJSON')
+    else:
+        try:
+            items = iter_json_array(request.stream)
+        except ValueError:
+            raise BadRequest('Failed to decode JSON body')
+    return (parse_document(index, item) for index, item in enumerate(items))
+
+
+def parse_document(index, item):
+    """
+    Parse document of batch request
+    :param index: int index of document in batch
+    :param item: bytes line of NDJSON or parsed JSON value
+    :return: tuple of id and text
+    """
+    if isinstance(item, bytes):
+        try:
+            item = json.loads(item)
+        except ValueError:
+            item = None
+    if isinstance(item, dict):
+        return item.get('id', index), item.get('data')
+    return index, item
+
+
+def batch_response(name, process):
+    """
+    Response streaming NDJSON results of batch request as soon as every
+    micro-batch of documents is processed
+    :param name: string key of result
+    :param process: function that takes list of texts and returns list of (result, cache status)
+    :return: response
+    """
+    documents = read_documents()
+
+    def generate():
+        while True:
+            batch = list(islice(documents, app.config['BATCH_SIZE']))
+            if not batch:
+                break
+            valid = [(doc_id, data) for doc_id, data in batch if isinstance(data, str)]
+            results = iter(process([data for _, data in valid]))
+            for doc_id, data in batch:
+                if isinstance(data, str):
+                    result, cache_status = next(results)
+                    cache_requests.inc(cache_status)
+                    line = {'id': doc_id, name: result, 'cache': cache_status}
+                else:
+                    line = {'id': doc_id, 'error': 'Document has to be a string or an object with string data'}
+                yield json.dumps(line) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/<filename>/text_analysis/')
+@logger_exception
+def analyze(filename):
+    upload = uploaded_file(filename)
+    if upload is None:
         return jsonify('File not found'), 400
+    analyzer = TextAnalysis(filepath=upload['path'], streaming=True)
+    result, cache_status = result_cache.get_or_compute(
+        'text_analysis', text_analysis.VERSION, upload['digest'],
+        lambda: analyzer.analyze(executor=get_analysis_executor())
+    )
+    return cached_response(result, cache_status)
 
 
 @app.route('/text_analysis', methods=('POST', ))
 @logger_exception
 def analyze_post():
     data = request.get_json().get('data')
-    analyzer = TextAnalysis(text=data)
-    return jsonify({
+    result, cache_status = text_analysis_result(data)
+    return cached_response({
         'original_text': data,
-        'text_analysis': analyzer.analyze()
-    })
+        'text_analysis': result
+    }, cache_status)
 
 
 @app.route('/<filename>/spell_check')
 @logger_exception
 def spell_check(filename):
-    try:
-        spell_checker = SpellChecker()
-        result = spell_checker.multiple_check(
-            open(os.path.join(app.config['UPLOAD_FOLDER'], filename)).read()
-        )
-        return jsonify(result)
-    except FileNotFoundError as e:
+    upload = uploaded_file(filename)
+    if upload is None:
         return jsonify('File not found'), 400
+    checker = get_spell_checker()
+    result, cache_status = result_cache.get_or_compute(
+        'spell_check', spell_check_version(checker), upload['digest'],
+        lambda: checker.check_file(upload['path'], executor=get_analysis_executor())
+    )
+    return cached_response(result, cache_status)
 
 
 @app.route('/spell_check', methods=('POST', ))
 @logger_exception
 def spell_check_post():
     data = request.get_json().get('data')
-    spell_checker = SpellChecker()
-    result = spell_checker.multiple_check(data)
-    return jsonify({
+    result, cache_status = spell_check_result(data)
+    return cached_response({
         'original_text': data,
         'spell_check': result
-    })
+    }, cache_status)
+
+
+@app.route('/spell_check/stats')
+@logger_exception
+def spell_check_stats():
+    return jsonify(get_spell_checker().cache_stats())
 
 
 @app.route('/<filename>/sentiment_analysis/')
 @logger_exception
 def sentiment_analysis(filename):
-    try:
-        data = open('text_data/text.txt').read()
-        words = [word for word in tokenize(data)]
-        classifiers = Classifiers()
-        classifiers.get_trained()
-        naive_best_words = classifiers.naive_best_words.predict(words)
-        naive_bag_of_words = classifiers.naive_bag_of_words.predict(words)
-        svm = classifiers.svm.predict(words)
-        result = {
+    def predict():
+        words = [word for word in tokenize(open(filepath).read())]
+        naive_best_words = models['naive_best_words'].predict(words)
+        naive_bag_of_words = models['naive_bag_of_words'].predict(words)
+        svm = models['svm'].predict(words)
+        return {
             'naive_best_words': dict(zip(words, naive_best_words)),
             'naive_bag_of_words': dict(zip(words, naive_bag_of_words)),
             'svm': dict(zip(words, svm))
         }
-        return jsonify(result)
+
+    try:
+        filepath = 'text_data/text.txt'
+        models, version = sentiment_models()
+        result, cache_status = result_cache.get_or_compute(
+            'sentiment_analysis_words', version, file_digest(filepath), predict
+        )
+        return cached_response(result, cache_status)
     except FileNotFoundError as e:
         return jsonify('File not found', 400)
 
@@ -121,21 +576,100 @@ def sentiment_analysis(filename):
 @logger_exception
 def sentiment_analysis_post():
     data = request.get_json().get('data')
-    words = [sent for sent in tokenize(data)]
-    classifiers = Classifiers()
-    classifiers.get_trained()
-    naive_best_words = classifiers.naive_best_words.predict_prob(words)
-    naive_bag_of_words = classifiers.naive_bag_of_words.predict_prob(words)
-    svm = classifiers.svm.predict(words)
-    result = {
+    result, cache_status = sentiment_results([data])[0]
+    return cached_response({
         'original_text': data,
-        'classifiers': {
-            'naive_best_words': naive_best_words,
-            'naive_bag_of_words': naive_bag_of_words,
-            'svm': svm
+        'classifiers': result
+    }, cache_status)
+
+
+@app.route('/text_analysis/batch', methods=('POST', ))
+@logger_exception
+def analyze_batch():
+    return batch_response('text_analysis', lambda texts: [text_analysis_result(text) for text in texts])
+
+
+@app.route('/spell_check/batch', methods=('POST', ))
+@logger_exception
+def spell_check_batch():
+    return batch_response('spell_check', lambda texts: [spell_check_result(text) for text in texts])
+
+
+@app.route('/sentiment_analysis/batch', methods=('POST', ))
+@logger_exception
+def sentiment_analysis_batch():
+    return batch_response('classifiers', sentiment_results)
+
+
+@app.route('/analyze', methods=('POST', ))
+@logger_exception
+def analyze_all_post():
+    def analyze_all():
+        document = TokenizedDocument(data)
+        words = document.tokens('word')
+        tokenized = [[word] for word in words]
+        return {
+            'text_analysis': TextAnalysis(document=document).analyze(),
+            'spell_check': checker.correct_words(
+                document.words(), executor=get_analysis_executor(), context=app.config['SPELL_CHECK_CONTEXT']
+            ),
+            'classifiers': {
+                'naive_best_words': models['naive_best_words'].predict_prob(tokenized, tokenized=True),
+                'naive_bag_of_words': models['naive_bag_of_words'].predict_prob(tokenized, tokenized=True),
+                'svm': models['svm'].predict(words)
+            }
         }
-    }
-    return jsonify(result)
+
+    data = request.get_json().get('data')
+    checker = get_spell_checker()
+    models, models_version = sentiment_models()
+    version = '{}-{}-{}'.format(text_analysis.VERSION, spell_check_version(checker), models_version)
+    result, cache_status = result_cache.get_or_compute('analyze', version, text_digest(data), analyze_all)
+    result = dict(result, original_text=data)
+    return cached_response(result, cache_status)
+
+
+@app.route('/cache')
+@logger_exception
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+
+@app.route('/models')
+@logger_exception
+def models():
+    return jsonify(registry.stats())
+
+
+@app.route('/resources')
+@logger_exception
+def resources_stats():
+    return jsonify(resources.stats())
+
+
+# metrics of the worker process which served the request (see gunicorn_config)
+@app.route('/metrics')
+def metrics_text():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/metrics/profiler', methods=('GET', 'POST'))
+@logger_exception
+def profiler_settings():
+    if request.method == 'POST':
+        settings = request.get_json()
+        if settings.get('enabled', True):
+            profiler.start(settings.get('threshold'))
+        else:
+            profiler.stop()
+    return jsonify(profiler.stats())
+
+
+if app.config['PRELOAD']:
+    preload()
+
+if app.config['PROFILE_SLOW_REQUESTS']:
+    profiler.start(float(app.config['PROFILE_SLOW_REQUESTS']))
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,394 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from werkzeug.exceptions import HTTPException
+import api
+from utils import logger_exception
+from metrics import metrics
+
+
+# limits of groups of endpoints: number of requests handled at the same time (and threads of group),
+# number of requests waiting for a free slot (more are rejected with 503)
+# and number of seconds to respond (0 disables timeout, slower requests get 504)
+LIMITS = {
+    # recognition waits for recognition service, so many requests can run at the same time
+    'speech_to_text': {'concurrency': 8, 'queue': 16, 'timeout': 300},
+    'spell_check': {'concurrency': 2, 'queue': 8, 'timeout': 60},
+    'text_analysis': {'concurrency': 2, 'queue': 8, 'timeout': 60},
+    'sentiment_analysis': {'concurrency': 4, 'queue': 32, 'timeout': 10},
+    # uploads, jobs, statistics; long polling of jobs waits up to JOB_MAX_WAIT
+    'default': {'concurrency': 16, 'queue': 64, 'timeout': 0},
+}
+# endpoint (name of Flask view) -> group, other endpoints are in default group
+ENDPOINT_GROUPS = {
+    'get_text_from_audio': 'speech_to_text',
+    'spell_check': 'spell_check',
+    'spell_check_post': 'spell_check',
+    'spell_check_batch': 'spell_check',
+    'analyze': 'text_analysis',
+    'analyze_post': 'text_analysis',
+    'analyze_batch': 'text_analysis',
+    'analyze_all_post': 'text_analysis',
+    'sentiment_analysis': 'sentiment_analysis',
+    'sentiment_analysis_post': 'sentiment_analysis',
+    'sentiment_analysis_batch': 'sentiment_analysis',
+}
+# request bodies bigger than that are spooled to disk
+SPOOL_SIZE = 1 << 20
+
+rejected_requests = metrics.counter(
+    'asgi_rejected_requests_total', 'Requests rejected by group of endpoints and reason', ('group', 'reason')
+)
+queue_wait = metrics.histogram('asgi_queue_wait_seconds', 'Time requests waited for free slot', ('group', ))
+
+
+class Rejected(Exception):
+    """
+    Raised when request can not be handled, has HTTP status and message
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class EndpointGroup:
+    """
+    Endpoints sharing limits and thread pool. Requests wait for one of
+    concurrency slots, requests over queue limit are rejected at once,
+    so a burst of heavy requests of one group can not starve other groups.
+    """
+
+    def __init__(self, name, concurrency, queue, timeout):
+        """
+        :param name: string name of group
+        :param concurrency: int number of requests handled at the same time
+        :param queue: int max number of requests waiting for slot
+        :param timeout: float seconds to respond, 0 disables timeout
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix='asgi-{}'.format(name))
+        self.running = 0
+        self.waiting = 0
+        self.handled = 0
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # created in running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def acquire(self, deadline):
+        """
+        Wait for free slot
+        :param deadline: float loop time of timeout or None
+        :raises Rejected: when queue is full or slot is not free before deadline
+        """
+        if self.semaphore.locked() and self.waiting >= self.queue:
+            rejected_requests.inc(self.name, 'queue_full')
+            raise Rejected(503, 'Too many requests are waiting. Please try again later')
+        start_time = time.perf_counter()
+        self.waiting += 1
+        try:
+            # free slot is taken at once, before other requests check the queue
+            if deadline is None or not self.semaphore.locked():
+                await self.semaphore.acquire()
+            else:
+                await asyncio.wait_for(self.semaphore.acquire(), max(deadline - asyncio.get_running_loop().time(), 0))
+        except asyncio.TimeoutError:
+            rejected_requests.inc(self.name, 'timeout')
+            raise Rejected(504, 'Request was not handled in {} seconds'.format(self.timeout))
+        finally:
+            self.waiting -= 1
+        queue_wait.observe(time.perf_counter() - start_time, self.name)
+        self.running += 1
+
+    def release(self, *args):
+        self.running -= 1
+        self.handled += 1
+        self.semaphore.release()
+
+    def stats(self):
+        return {
+            'concurrency': self.concurrency,
+            'queue': self.queue,
+            'timeout': self.timeout,
+            'running': self.running,
+            'waiting': self.waiting,
+            'handled': self.handled,
+        }
+
+
+def wsgi_environ(scope, body):
+    """
+    WSGI environ of ASGI HTTP request
+    :param scope: dict ASGI scope
+    :param body: file-like object of request body
+    :return: dict
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': quote(scope.get('root_path', '').encode('utf-8')),
+        # WSGI paths are latin-1 decoded bytes
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        # whole body is read, so it can be read without content length (chunked requests)
+        'wsgi.input_terminated': True,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+class App:
+    """
+    ASGI application serving Flask routes of api with the same responses.
+    Every request is handled by thread pool of its group of endpoints
+    (see LIMITS) with limited concurrency, waiting queue and timeout,
+    while event loop only reads requests and writes responses, so slow
+    requests hold a slot of their group, not the server. Timeout applies to
+    the whole response, also to every chunk of streamed responses.
+    Threads of groups share GIL, only big texts of text analysis and spell
+    check run in process pool of api when ANALYSIS_WORKERS is 2 or more.
+    """
+
+    def __init__(self, flask_app, limits=None, endpoint_groups=None):
+        """
+        :param flask_app: Flask application
+        :param limits: dict group -> dict of concurrency, queue and timeout
+        :param endpoint_groups: dict endpoint -> group
+        """
+        self.flask_app = flask_app
+        self.endpoint_groups = ENDPOINT_GROUPS if endpoint_groups is None else endpoint_groups
+        self.groups = {
+            name: EndpointGroup(name, **limit) for name, limit in (LIMITS if limits is None else limits).items()
+        }
+        self.url_map = flask_app.url_map
+
+    def group(self, scope):
+        """
+        Group of endpoint of request
+        :param scope: dict ASGI scope
+        :return: EndpointGroup
+        """
+        try:
+            endpoint, _ = self.url_map.bind('localhost').match(scope['path'], scope['method'])
+        except HTTPException:
+            endpoint = None
+        return self.groups[self.endpoint_groups.get(endpoint, 'default')]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported scope type: {}'.format(scope['type']))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for group in self.groups.values():
+                    group.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive, max_size):
+        """
+        Read request body, big bodies are spooled to disk
+        :param receive: ASGI receive function
+        :param max_size: int max size in bytes or None
+        :return: file-like object or None if client disconnected
+        :raises Rejected: when body is bigger than max_size
+        """
+        body = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                body.close()
+                raise Rejected(413, 'File is bigger than {} bytes'.format(api.app.config['UPLOAD_MAX_SIZE']))
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+        body.seek(0)
+        return body
+
+    @staticmethod
+    async def respond(send, status, message, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')] + list(headers),
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps({'message': message}).encode('utf-8')})
+
+    async def http(self, scope, receive, send):
+        group = self.group(scope)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + group.timeout if group.timeout else None
+        try:
+            await group.acquire(deadline)
+        except Rejected as e:
+            # body of rejected request is not read
+            await self.respond(send, e.status, e.message, [(b'retry-after', b'5')] if e.status == 503 else [])
+            return
+        released = False
+        body = None
+        try:
+            try:
+                body = await self.read_body(receive, self.flask_app.config.get('MAX_CONTENT_LENGTH'))
+            except Rejected as e:
+                await self.respond(send, e.status, e.message)
+                return
+            if body is None:
+                return
+            environ = wsgi_environ(scope, body)
+            started = []
+            # WSGI response and its iterator, set by handler thread
+            response = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [status, headers]
+
+            def handle():
+                response.append(self.flask_app.wsgi_app(environ, start_response))
+                response.append(iter(response[0]))
+                # first chunk is computed in handler thread, so whole response of
+                # not streamed routes is ready when it is sent
+                return next(response[1], None)
+
+            def close():
+                # response read only partly is closed too, that ends Flask request context
+                if response and hasattr(response[0], 'close'):
+                    response[0].close()
+
+            # Flask keeps request context in context variables, so every step
+            # of streamed response has to run in the same context
+            context = contextvars.copy_context()
+            running = []
+
+            async def run(func, *args):
+                # step of response runs in thread of group, deadline applies to every step
+                future = loop.run_in_executor(group.executor, context.run, func, *args)
+                if deadline is None:
+                    return await future
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    running.append(future)
+                    raise
+
+            response_started = False
+            try:
+                chunk = await run(handle)
+                status, headers = started
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+                })
+                response_started = True
+                # streamed responses (NDJSON of batches) are sent as soon as every chunk is ready
+                while chunk is not None:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await run(next, response[1], None)
+            except asyncio.TimeoutError:
+                rejected_requests.inc(group.name, 'timeout')
+
+                def closed(future):
+                    # errors of handler are logged by Flask
+                    future.exception()
+                    body.close()
+                    group.release()
+
+                def finished(future):
+                    if not future.cancelled():
+                        future.exception()
+                    loop.run_in_executor(group.executor, context.run, close).add_done_callback(closed)
+
+                # thread can not be stopped, it holds slot of group until it finishes
+                running[0].add_done_callback(finished)
+                released = True
+                if not response_started:
+                    await self.respond(send, 504, 'Request was not handled in {} seconds'.format(group.timeout))
+                # otherwise response is not completed, so server closes connection
+                return
+            finally:
+                if not released:
+                    await loop.run_in_executor(group.executor, context.run, close)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # timed out request is released when its thread finishes
+            if not released:
+                if body is not None:
+                    body.close()
+                group.release()
+
+    def stats(self):
+        """
+        Limits and load of groups of endpoints
+        :return: dict group -> dict
+        """
+        return {name: group.stats() for name, group in self.groups.items()}
+
+
+def limits_from_environ(environ=os.environ):
+    """
+    Default limits updated with JSON of ASGI_LIMITS environment variable,
+    e.g. {"spell_check": {"concurrency": 1, "timeout": 30}}
+    :return: dict group -> dict of concurrency, queue and timeout
+    """
+    limits = {name: dict(limit) for name, limit in LIMITS.items()}
+    for name, limit in json.loads(environ.get('ASGI_LIMITS') or '{}').items():
+        limits.setdefault(name, dict(LIMITS['default'])).update(limit)
+    return limits
+
+
+# uvicorn asgi:app
+app = App(api.app, limits_from_environ())
+
+
+@api.app.route('/asgi')
+@logger_exception
+def asgi_stats():
+    return api.jsonify(app.stats())
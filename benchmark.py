@@ -0,0 +1,332 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+
+
+# change it when workloads change, results of other versions are not compared
+VERSION = '1'
+DOCUMENT_SIZES = (1000, 10000, 100000)
+TYPOS_COUNT = 500
+
+
+def sample_sentences(path='text_data/text.txt'):
+    """
+    Sentences of sample text, split without NLTK data
+    :param path: string path to text
+    :return: list of sentences
+    """
+    with open(path) as f:
+        text = f.read()
+    return [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]
+
+
+def generate_document(sentences, size, seed=0):
+    """
+    Document made of randomly chosen sentences
+    :param sentences: list of sentences
+    :param size: int number of characters of document
+    :param seed: int seed, the same seed gives the same document
+    :return: string document
+    """
+    rand = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        sentence = rand.choice(sentences)
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(parts)[:size]
+
+
+def generate_typos(words, count, seed=0):
+    """
+    Misspelled words made by one or two random edits of dictionary words
+    :param words: list of words
+    :param count: int number of typos
+    :param seed: int seed, the same seed gives the same typos
+    :return: list of typos
+    """
+    rand = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    typos = []
+    for _ in range(count):
+        word = rand.choice(words)
+        for _ in range(rand.choice((1, 1, 2))):
+            i = rand.randrange(len(word))
+            edit = rand.choice(('delete', 'transpose', 'replace', 'insert'))
+            if edit == 'delete' and len(word) > 1:
+                word = word[:i] + word[i + 1:]
+            elif edit == 'transpose' and i < len(word) - 1:
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            elif edit == 'replace':
+                word = word[:i] + rand.choice(letters) + word[i + 1:]
+            else:
+                word = word[:i] + rand.choice(letters) + word[i:]
+        typos.append(word)
+    return typos
+
+
+def measure(function, repeat=5, warmup=1, items=1, memory=True):
+    """
+    Run function several times and measure it
+    :param function: function without arguments
+    :param repeat: int number of measured calls
+    :param warmup: int number of calls before measuring
+    :param items: int number of processed items (documents, words) by one call
+    :param memory: bool measure peak memory of one more call with tracemalloc,
+     which is not timed as tracing slows code down
+    :return: dict of statistics
+    """
+    for _ in range(warmup):
+        function()
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start_time)
+    latencies = np.array(latencies)
+    result = {
+        'calls': repeat,
+        'items': items,
+        'throughput': items * repeat / latencies.sum(),
+        'mean': latencies.mean(),
+        'p50': np.percentile(latencies, 50),
+        'p95': np.percentile(latencies, 95),
+        'p99': np.percentile(latencies, 99),
+        'peak_memory': None,
+    }
+    if memory:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            function()
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+    return {key: float(value) if isinstance(value, np.floating) else value for key, value in result.items()}
+
+
+class Benchmark:
+    """
+    Reproducible workloads of analyzers and endpoints.
+    Every workload is set up lazily, workloads which can not run
+    (e.g. models are not trained) are reported as skipped.
+    """
+
+    def __init__(self, sizes=DOCUMENT_SIZES, repeat=5, typos=TYPOS_COUNT, memory=True):
+        """
+        :param sizes: list of int sizes of generated documents in characters
+        :param repeat: int number of measured calls of every workload
+        :param typos: int number of misspelled words checked by spell checker
+        :param memory: bool measure peak memory
+        """
+        self.sizes = sizes
+        self.repeat = repeat
+        self.typos_count = typos
+        self.memory = memory
+        self.sentences = sample_sentences()
+        self.documents = {size: generate_document(self.sentences, size, seed=size) for size in sizes}
+        self.sample = ' '.join(self.sentences)
+        self._spell_checker = None
+        self._client = None
+
+    @staticmethod
+    def _label(size):
+        return '{}k'.format(size // 1000) if size >= 1000 else str(size)
+
+    def spell_checker(self):
+        if self._spell_checker is None:
+            from api import get_spell_checker
+            self._spell_checker = get_spell_checker()
+        return self._spell_checker
+
+    def client(self):
+        if self._client is None:
+            from api import app
+            self._client = app.test_client()
+        return self._client
+
+    def workloads(self):
+        """
+        Generator. Yields name and function which returns tuple of
+        measured function and number of items processed by it
+        """
+        from text_analysis import TextAnalysis
+        from model_registry import registry
+
+        def text_analysis(text):
+            return lambda: TextAnalysis(text=text).analyze(), 1
+
+        yield 'text_analysis.analyze/sample', lambda: text_analysis(self.sample)
+        for size in self.sizes:
+            yield 'text_analysis.analyze/{}'.format(self._label(size)), lambda size=size: text_analysis(
+                self.documents[size]
+            )
+
+        def spell_check():
+            checker = self.spell_checker()
+            words = sorted((w for w in checker.words if len(w) > 3), key=checker.words.rank)[:5000]
+            typos = generate_typos(words, self.typos_count)
+
+            def check():
+                # measure corrections, not cache
+                checker.cache.clear()
+                for typo in typos:
+                    checker.check(typo)
+            return check, len(typos)
+
+        def multiple_check(text):
+            checker = self.spell_checker()
+
+            def check():
+                checker.cache.clear()
+                checker.multiple_check(text)
+            return check, 1
+
+        yield 'spell_checker.check/typos', spell_check
+        yield 'spell_checker.multiple_check/sample', lambda: multiple_check(self.sample)
+        for size in self.sizes:
+            yield 'spell_checker.multiple_check/{}'.format(self._label(size)), lambda size=size: multiple_check(
+                self.documents[size]
+            )
+
+        def predict(name, method):
+            model = registry.get(name)
+            words = self.sample.split()
+            return lambda: getattr(model, method)(words), len(words)
+
+        for name in ('naive_bag_of_words', 'naive_best_words'):
+            yield 'classifiers.{}.predict/sample'.format(name), lambda name=name: predict(name, 'predict')
+            yield 'classifiers.{}.predict_prob/sample'.format(name), lambda name=name: predict(name, 'predict_prob')
+        yield 'classifiers.svm.predict/sample', lambda: predict('svm', 'predict')
+
+        def endpoint(path, text):
+            import api
+            client = self.client()
+
+            def post():
+                # measure computation, not result cache
+                api.result_cache.memory.clear()
+                response = client.post(path, json={'data': text})
+                if response.status_code != 200:
+                    raise RuntimeError('{} responded with {}'.format(path, response.status_code))
+            return post, 1
+
+        for path in ('/text_analysis', '/spell_check', '/sentiment_analysis', '/analyze'):
+            yield 'api.{}/sample'.format(path.strip('/')), lambda path=path: endpoint(path, self.sample)
+            size = self.sizes[len(self.sizes) // 2]
+            yield 'api.{}/{}'.format(path.strip('/'), self._label(size)), lambda path=path, size=size: endpoint(
+                path, self.documents[size]
+            )
+
+    def run(self, only=None, report=None):
+        """
+        Run workloads
+        :param only: string, run only workloads which name contains it
+        :param report: function called with name and result of every workload
+        :return: dict name -> result
+        """
+        results = {}
+        for name, setup in self.workloads():
+            if only and only not in name:
+                continue
+            try:
+                function, items = setup()
+                result = measure(function, self.repeat, items=items, memory=self.memory)
+            except Exception as e:
+                result = {'skipped': '{}: {}'.format(e.__class__.__name__, e)}
+            results[name] = result
+            if report:
+                report(name, result)
+        return results
+
+
+def save_baseline(results, path):
+    """
+    Save results as JSON baseline
+    :param results: dict name -> result
+    :param path: string path
+    """
+    with open(path, 'w') as f:
+        json.dump({
+            'version': VERSION,
+            'created': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+def compare(results, path, threshold=0.1):
+    """
+    Compare results with baseline
+    :param results: dict name -> result
+    :param path: string path to baseline
+    :param threshold: float relative increase of median latency reported as regression
+    :return: list of tuples of name, baseline median, current median and relative change
+     of workloads slower than threshold
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('version') != VERSION:
+        raise ValueError('Baseline {} was made by other version of workloads'.format(path))
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if not base or 'p50' not in base or 'p50' not in result:
+            continue
+        change = result['p50'] / base['p50'] - 1
+        print('{:<50} {:>10.2f} ms {:>10.2f} ms {:>+8.1%}'.format(name, base['p50'] * 1000, result['p50'] * 1000, change))
+        if change > threshold:
+            regressions.append((name, base['p50'], result['p50'], change))
+    return regressions
+
+
+def print_result(name, result):
+    if 'skipped' in result:
+        print('{:<50} skipped ({})'.format(name, result['skipped']))
+        return
+    memory = '{:.1f} MB'.format(result['peak_memory'] / 2 ** 20) if result['peak_memory'] is not None else '-'
+    print('{:<50} {:>10.1f}/s  p50 {:>9.2f} ms  p95 {:>9.2f} ms  p99 {:>9.2f} ms  peak {:>9}'.format(
+        name, result['throughput'], result['p50'] * 1000, result['p95'] * 1000, result['p99'] * 1000, memory
+    ))
+
+
+if __name__ == '__main__':
+    # python benchmark.py --save baseline.json
+    # python benchmark.py --compare baseline.json
+    parser = argparse.ArgumentParser(description='Benchmark analyzers and endpoints')
+    parser.add_argument('--only', help='run only workloads which name contains it')
+    parser.add_argument('--repeat', type=int, default=5, help='number of measured calls of every workload')
+    parser.add_argument('--sizes', default=','.join(map(str, DOCUMENT_SIZES)),
+                        help='comma separated sizes of generated documents in characters')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    parser.add_argument('--save', help='save results as JSON baseline')
+    parser.add_argument('--compare', help='compare results with JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative increase of median latency reported as regression')
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.realpath(__file__)))
+    benchmark = Benchmark(
+        sizes=[int(size) for size in args.sizes.split(',')], repeat=args.repeat, memory=not args.no_memory
+    )
+    results = benchmark.run(args.only, print_result)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for name, base, current, change in regressions:
+            print('Regression: {} is {:.1%} slower'.format(name, change))
+        if regressions:
+            sys.exit(1)
@@ -1,19 +1,22 @@
 import os
+import json
 import random
 import string
-import pickle
 import collections
+import numpy as np
+from scipy import sparse
+from scipy.special import expit
 from sklearn import svm
 from nltk.metrics import *
 import nltk.classify.util
-from nltk import sent_tokenize
-from nltk import word_tokenize
-from nltk.metrics import BigramAssocMeasures
 from nltk.classify import NaiveBayesClassifier
-from nltk.corpus import movie_reviews, stopwords
+from nltk.corpus import movie_reviews
 from sklearn.metrics import classification_report
-from nltk.probability import FreqDist, ConditionalFreqDist
 from sklearn.feature_extraction.text import TfidfVectorizer
+import metrics
+from utils import tokenize
+from model_format import NaiveBayesScoring, binary_matrix, naive_bayes_probabilities
+from resources import resources
 
 
 class SVMClassifier:
@@ -80,20 +83,236 @@ class SVMClassifier:
         :return: list of predicted labels
         """
         # probability predict 'pos' class
-        return [i[1] for i in self.classifier._predict_proba_lr(self.vectorizer.transform(data)).tolist()]
+        return self.batch_predict_prob(data).tolist()
+
+    @metrics.timed('svm_predict')
+    def batch_predict_prob(self, documents, batch_size=10000):
+        """
+        Probabilities of 'pos' label for many documents at once
+        :param documents: list of string texts
+        :param batch_size: int number of documents vectorized together
+        :return: numpy array of probabilities
+        """
+        probabilities = []
+        for start in range(0, len(documents), batch_size):
+            vectors = self.vectorizer.transform(documents[start:start + batch_size])
+            # decision function is positive for the second class
+            decision = self.classifier.decision_function(vectors)
+            if self.classifier.classes_[1] != 'pos':
+                decision = -decision
+            probabilities.append(expit(decision))
+        if not probabilities:
+            return np.empty(0)
+        return np.concatenate(probabilities)
+
+
+# changes when selection of best words changes
+BEST_WORDS_VERSION = '1'
 
 
-class BayesClassifier:
+def chi_square_scores(label_counts):
+    """
+    Chi-square association of every word with every label,
+    as nltk BigramAssocMeasures.chi_sq computed for all words at once
+    :param label_counts: matrix of word counts (labels x words)
+    :return: vector of scores of words summed over labels
+    """
+    label_counts = np.asarray(label_counts, dtype=np.float64)
+    words_counts = label_counts.sum(axis=0)
+    labels_counts = label_counts.sum(axis=1, keepdims=True)
+    total = labels_counts.sum()
+    # contingency table of word and label
+    n_ii = label_counts
+    n_io = words_counts - n_ii
+    n_oi = labels_counts - n_ii
+    n_oo = total - n_ii - n_io - n_oi
+    phi_sq = (n_ii * n_oo - n_io * n_oi) ** 2 / ((n_ii + n_io) * (n_ii + n_oi) * (n_io + n_oo) * (n_oi + n_oo))
+    return (total * phi_sq).sum(axis=0)
+
+
+def select_best_words(label_tokens, count=10000, stopset=frozenset()):
+    """
+    Words most associated with labels by chi-square
+    :param label_tokens: dict label -> iterable of tokens of all documents with label
+    :param count: int number of best words before stop words are removed
+    :param stopset: set of words which are never selected
+    :return: list of best words, best first
+    """
+    counters = {label: collections.Counter(map(str.lower, tokens)) for label, tokens in label_tokens.items()}
+    # words in order of first occurrence, so ties are broken as in sorting of dict
+    vocabulary = list(dict.fromkeys(word for counter in counters.values() for word in counter))
+    label_counts = np.array([[counter.get(word, 0) for word in vocabulary] for counter in counters.values()])
+    scores = chi_square_scores(label_counts)
+    if count < len(scores):
+        # keep all words tied with the last selected one and sort only them
+        threshold = scores[np.argpartition(-scores, count - 1)[count - 1]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    best = candidates[np.argsort(-scores[candidates], kind='stable')][:count]
+    return [vocabulary[i] for i in best if vocabulary[i] not in stopset]
+
+
+def save_best_words(words, path, **metadata):
+    """
+    Save best words as versioned artifact
+    :param words: list of words
+    :param path: string path to JSON file
+    :param metadata: JSON serializable description of corpus
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(dict(metadata, version=BEST_WORDS_VERSION, words=words), f)
+    os.replace(tmp_path, path)
+
+
+def load_best_words(path):
+    """
+    Load best words saved by save_best_words
+    :param path: string path to JSON file
+    :return: list of words or None if file does not exist or has other version
+    """
+    try:
+        with open(path) as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if artifact.get('version') != BEST_WORDS_VERSION:
+        return None
+    return artifact['words']
+
+
+class SparseNaiveBayes:
+    """
+    Naive Bayes classifier of binary features trained and applied with sparse
+    matrix operations. Features are mapped to integer ids of fixed vocabulary,
+    documents are rows of CSR matrix. Probabilities are smoothed with expected
+    likelihood estimate as in nltk NaiveBayesClassifier, so both give the same predictions.
+    """
+
+    def __init__(self, labels, vocabulary, feature_log_probs, label_log_probs):
+        """
+        :param labels: list of labels
+        :param vocabulary: dict feature -> id
+        :param feature_log_probs: matrix of base 2 log probabilities of features (labels x features)
+        :param label_log_probs: vector of base 2 log probabilities of labels
+        """
+        self._labels = list(labels)
+        self.vocabulary = vocabulary
+        self.feature_log_probs = feature_log_probs
+        self.label_log_probs = label_log_probs
+
+    @classmethod
+    def train(cls, labeled_features):
+        """
+        Train classifier
+        :param labeled_features: iterable of tuples of iterable of features present in document
+         (dicts of nltk featuresets work too) and label
+        :return: SparseNaiveBayes
+        """
+        vocabulary, label_ids = {}, {}
+        indptr, indices, document_labels = [0], [], []
+        for features, label in labeled_features:
+            indices.extend(vocabulary.setdefault(f, len(vocabulary)) for f in features)
+            indptr.append(len(indices))
+            document_labels.append(label_ids.setdefault(label, len(label_ids)))
+        labels = sorted(label_ids, key=label_ids.get)
+        matrix = binary_matrix(indices, indptr, len(vocabulary))
+        document_labels = np.array(document_labels)
+        label_counts = np.bincount(document_labels, minlength=len(labels))
+        # rows select documents of label, so product counts documents of label with feature
+        label_matrix = sparse.csr_matrix(
+            (np.ones(len(document_labels)), (document_labels, np.arange(len(document_labels)))),
+            shape=(len(labels), len(document_labels))
+        )
+        feature_counts = (label_matrix @ matrix).toarray()
+        # as NLTK, feature has one value (True) if it is present in all documents, otherwise two (True, None)
+        bins = np.where((feature_counts == label_counts[:, np.newaxis]).all(axis=0), 1, 2)
+        feature_log_probs = np.log2((feature_counts + 0.5) / (label_counts[:, np.newaxis] + 0.5 * bins))
+        label_log_probs = np.log2((label_counts + 0.5) / (label_counts.sum() + 0.5 * len(labels)))
+        return cls(labels, vocabulary, feature_log_probs, label_log_probs)
+
+    def labels(self):
+        return self._labels
+
+    def tables(self):
+        """
+        Log probability tables
+        :return: tuple of labels, dict feature -> column,
+         matrix of feature log probabilities (labels x features)
+         and vector of label log probabilities
+        """
+        return self._labels, self.vocabulary, self.feature_log_probs, self.label_log_probs
+
+    def prob_classify_many(self, featuresets):
+        """
+        Label probabilities of documents
+        :param featuresets: iterable of iterables of features present in documents
+        :return: matrix of probabilities (documents x labels)
+        """
+        vocabulary = self.vocabulary
+        indptr, indices = [0], []
+        for features in featuresets:
+            # features not seen in training are ignored as in NLTK
+            indices.extend(vocabulary[f] for f in features if f in vocabulary)
+            indptr.append(len(indices))
+        matrix = binary_matrix(indices, indptr, len(vocabulary))
+        return naive_bayes_probabilities(matrix, self.feature_log_probs, self.label_log_probs)
+
+    def classify_many(self, featuresets):
+        """
+        :param featuresets: iterable of iterables of features present in documents
+        :return: list of labels
+        """
+        return [self._labels[i] for i in self.prob_classify_many(featuresets).argmax(axis=1)]
+
+    def classify(self, features):
+        """
+        :param features: iterable of features present in document
+        :return: label
+        """
+        return self.classify_many([features])[0]
+
+    def most_informative_features(self, n=100):
+        """
+        Features with the highest ratio of probabilities of labels
+        :param n: int number of features
+        :return: list of tuples of feature, most likely label, least likely label and ratio
+        """
+        features = sorted(self.vocabulary, key=self.vocabulary.get)
+        ratios = self.feature_log_probs.max(axis=0) - self.feature_log_probs.min(axis=0)
+        top = np.argsort(-ratios, kind='stable')[:n]
+        return [(
+            features[i],
+            self._labels[self.feature_log_probs[:, i].argmax()],
+            self._labels[self.feature_log_probs[:, i].argmin()],
+            float(np.exp2(ratios[i]))
+        ) for i in top]
+
+    def show_most_informative_features(self, n=10):
+        print('Most Informative Features')
+        for feature, label, other, ratio in self.most_informative_features(n):
+            print('{:>24} = True {:>6} : {:<6} = {:8.1f} : 1.0'.format(feature, label, other, ratio))
+
+
+class BayesClassifier(NaiveBayesScoring):
     """
     Naive Bayes classifier. Predicts pos/neg label for words.
     """
-    def __init__(self, model='bag_of_words', cfr=NaiveBayesClassifier):
+    def __init__(self, model='bag_of_words', cfr=NaiveBayesClassifier, best_words_path='best_words.json'):
+        """
+        :param model: string feature model, bag_of_words or best_words
+        :param cfr: classifier class, NaiveBayesClassifier or SparseNaiveBayes
+        :param best_words_path: string path to best words selected on training corpus
+         by training.TrainingPipeline, used when they were not set by set_best_words
+        """
         self.classifier = cfr
+        self.best_words_path = best_words_path
         self.train_data = []
         self.test_data = []
         self.best_words_set = None
         self.classes = ['pos', 'neg']
-        self.stopset = set(stopwords.words('english')).union(set(string.punctuation))
+        self.stopset = resources.stopwords().union(string.punctuation)
         self.models = {
             'bag_of_words': self.bag_of_words,
             'best_words': self.best_word_feats,
@@ -118,36 +337,50 @@ class BayesClassifier:
             self._get_best_words()
         return dict([(word, True) for word in words if word in self.best_words_set])
 
-    def _get_best_words(self):
+    def feature_words(self, words):
         """
-        Get best words set
+        Words used as features by model, SparseNaiveBayes takes them without dict
+        :param words: iterable of words
+        :return: list of words
         """
-        words_frequencies = FreqDist()
-        label_words_frequencies = ConditionalFreqDist()
-
-        for word in movie_reviews.words(categories=['pos']):
-            words_frequencies[word.lower()] += 1
-            label_words_frequencies['pos'][word.lower()] += 1
-
-        for word in movie_reviews.words(categories=['neg']):
-            words_frequencies[word.lower()] += 1
-            label_words_frequencies['neg'][word.lower()] += 1
+        if self.model == 'best_words':
+            if not self.best_words_set:
+                self._get_best_words()
+            return [word for word in words if word in self.best_words_set]
+        return [word for word in words if word not in self.stopset]
 
-        pos_words_count = label_words_frequencies['pos'].N()
-        neg_words_count = label_words_frequencies['neg'].N()
-        total_words_count = pos_words_count + neg_words_count
-
-        words_scores = {}
+    def featurize(self):
+        """
+        Feature function of model for engine of classifier
+        :return: function of list of words
+        """
+        sparse_engine = self.classifier is SparseNaiveBayes or isinstance(self.classifier, SparseNaiveBayes)
+        return self.feature_words if sparse_engine else self.models[self.model]
 
-        for word, frequency in words_frequencies.items():
-            pos_score = BigramAssocMeasures.chi_sq(label_words_frequencies['pos'][word],
-                (frequency, pos_words_count), total_words_count)
-            neg_score = BigramAssocMeasures.chi_sq(label_words_frequencies['neg'][word],
-                (frequency, neg_words_count), total_words_count)
-            words_scores[word] = pos_score + neg_score
+    def _get_best_words(self):
+        """
+        Get best words set. Loads words saved with the model by training (see training.TrainingPipeline)
+        :raises ValueError: when saved words are missing
+        """
+        words = load_best_words(self.best_words_path)
+        if words is None:
+            raise ValueError('Best words of model are missing in {}, train models with training.py'.format(
+                self.best_words_path
+            ))
+        self.set_best_words(words)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # pickled model without its best words fails when it is loaded, not on first request
+        if self.model == 'best_words' and not self.best_words_set:
+            self._get_best_words()
 
-        best_words = sorted(words_scores.items(), key=lambda x: x[1], reverse=True)[:10000]
-        self.best_words_set = set([w for w, s in best_words if w not in self.stopset])
+    def set_best_words(self, words):
+        """
+        Set best words, e.g. selected on custom corpus
+        :param words: iterable of words
+        """
+        self.best_words_set = set(w for w in words if w not in self.stopset)
 
     @staticmethod
     def tokenize(text):
@@ -155,18 +388,7 @@ class BayesClassifier:
         Generator. Yields tokens from text
         :param text: string
         """
-        # break the document into sentences
-        for sent in sent_tokenize(text):
-            # break the sentence into part of speech tagged tokens(words)
-            for token in word_tokenize(sent):
-                token = token.lower()
-                token = token.strip()
-                token = token.strip('_')
-
-                if all(char in set(string.punctuation) for char in token):
-                    continue
-
-                yield token
+        return tokenize(text)
 
     def prepare_simple_data(self):
         """
@@ -175,8 +397,9 @@ class BayesClassifier:
         neg_files = movie_reviews.fileids('neg')
         pos_files = movie_reviews.fileids('pos')
 
-        neg_data = [(self.models.get(self.model)(movie_reviews.words(fileids=[f])), 'neg') for f in neg_files]
-        pos_data = [(self.models.get(self.model)(movie_reviews.words(fileids=[f])), 'pos') for f in pos_files]
+        features = self.featurize()
+        neg_data = [(features(movie_reviews.words(fileids=[f])), 'neg') for f in neg_files]
+        pos_data = [(features(movie_reviews.words(fileids=[f])), 'pos') for f in pos_files]
 
         # split data to positive and negative
         neg_data_cut_index = int(len(neg_data) * 3 / 4)
@@ -219,28 +442,29 @@ class BayesClassifier:
             'neg recall:': recall(ref_sets['neg'], test_sets['neg'])
         }
 
-    def predict(self, data):
-        """
-        Predict label for text
-        :param data: string text
-        :return: list of labels
-        """
-        predictions = self.classifier.prob_classify_many(
-            self.models[self.model](self.tokenize(words)) for words in data
-        )
-        return [p.max() for p in predictions]
-
-    def predict_prob(self, data):
+    def _log_prob_tables(self):
         """
-        Prediction probabilities
-        :param data: string text
-        :return: list of probabilities
+        Log probability tables of trained NLTK or SparseNaiveBayes classifier
+        :return: tuple of labels, dict feature -> column,
+         matrix of feature log probabilities (labels x features)
+         and vector of label log probabilities
         """
-        predictions = self.classifier.prob_classify_many(
-            self.models[self.model](self.tokenize(words)) for words in data
-        )
-        preds = [p.prob('pos') for p in predictions if p.prob('pos') != 0.5]
-        return preds
+        tables = getattr(self, '_tables', None)
+        if tables is None and isinstance(self.classifier, SparseNaiveBayes):
+            tables = self._tables = self.classifier.tables()
+        if tables is None:
+            labels = list(self.classifier.labels())
+            features = {}
+            for label, feature in self.classifier._feature_probdist:
+                features.setdefault(feature, len(features))
+            # NLTK adds -inf for features not seen with label
+            feature_log_probs = np.full((len(labels), len(features)), -np.inf)
+            for (label, feature), probdist in self.classifier._feature_probdist.items():
+                feature_log_probs[labels.index(label), features[feature]] = probdist.logprob(True)
+            label_log_probs = np.array([self.classifier._label_probdist.logprob(label) for label in labels])
+            tables = labels, features, feature_log_probs, label_log_probs
+            self._tables = tables
+        return tables
 
 
 class Classifiers:
@@ -251,35 +475,18 @@ class Classifiers:
 
     def train_and_save(self):
         """
-        Train and serialize classifiers
+        Train classifiers using cached features and save them as model files (see training.TrainingPipeline)
         """
-        self.naive_bag_of_words.prepare_simple_data()
-        self.naive_bag_of_words.train()
-
-        self.naive_best_words.prepare_simple_data()
-        self.naive_best_words.train()
-
-        self.svm.prepare_data()
-        self.svm.train()
-
-        with open('naive_bag_of_words.pickle', 'wb') as f:
-            pickle.dump(self.naive_bag_of_words, f, -1)
-
-        with open('naive_best_words.pickle', 'wb') as f:
-            pickle.dump(self.naive_best_words, f, -1)
-
-        with open('svm.pickle', 'wb') as f:
-            pickle.dump(self.svm, f, -1)
+        from training import TrainingPipeline
+        TrainingPipeline().train_and_save()
+        self.get_trained()
 
     def get_trained(self):
         """
-        Get trained classifiers
+        Get trained classifiers from model files or pickles
         """
-        with open('naive_bag_of_words.pickle', 'rb') as f:
-            self.naive_bag_of_words = pickle.load(f)
-
-        with open('naive_best_words.pickle', 'rb') as f:
-            self.naive_best_words = pickle.load(f)
-
-        with open('svm.pickle', 'rb') as f:
-            self.svm = pickle.load(f)
+        from model_registry import ModelRegistry
+        registry = ModelRegistry()
+        self.naive_bag_of_words = registry.get('naive_bag_of_words')
+        self.naive_best_words = registry.get('naive_best_words')
+        self.svm = registry.get('svm')
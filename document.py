@@ -0,0 +1,80 @@
+from array import array
+from resources import resources
+from utils import clean_tokens
+from spell_checker import SpellChecker
+
+
+class TokenizedDocument:
+    """
+    Text split to sentences and tokens once and shared by all analyzers.
+    Tokens are stored as integer ids of document vocabulary with offsets
+    of sentences, every kind of tokenization is done only on first use.
+    """
+    TOKENIZERS = {
+        # tokens used by sentiment classifiers
+        'word': resources.word_tokenize,
+        # tokens used by text analysis
+        'wordpunct': resources.wordpunct_tokenize,
+    }
+
+    def __init__(self, text):
+        """
+        :param text: string text
+        """
+        self.text = text
+        self.sentences = resources.sent_tokenize(text)
+        self.vocabulary = []
+        self._ids = {}
+        self._tokens = {}
+        self._words = None
+
+    def _token_id(self, token):
+        token_id = self._ids.get(token)
+        if token_id is None:
+            token_id = self._ids[token] = len(self.vocabulary)
+            self.vocabulary.append(token)
+        return token_id
+
+    def _encode(self, kind):
+        """
+        Tokenize all sentences
+        :param kind: string tokenizer name
+        :return: tuple of array of token ids and array of sentences offsets
+        """
+        encoded = self._tokens.get(kind)
+        if encoded is None:
+            tokenizer = self.TOKENIZERS[kind]
+            ids = array('I')
+            offsets = array('I', [0])
+            for sent in self.sentences:
+                ids.extend(self._token_id(token) for token in clean_tokens(tokenizer(sent)))
+                offsets.append(len(ids))
+            encoded = self._tokens[kind] = ids, offsets
+        return encoded
+
+    def tokens(self, kind='word'):
+        """
+        Tokens of whole text
+        :param kind: string tokenizer name
+        :return: list of tokens
+        """
+        ids, _ = self._encode(kind)
+        return [self.vocabulary[token_id] for token_id in ids]
+
+    def sentence_tokens(self, kind='word'):
+        """
+        Generator. Yields list of tokens of every sentence
+        :param kind: string tokenizer name
+        """
+        ids, offsets = self._encode(kind)
+        for start, end in zip(offsets, offsets[1:]):
+            yield [self.vocabulary[token_id] for token_id in ids[start:end]]
+
+    def words(self):
+        """
+        Words checked by spell checker
+        :return: list of words
+        """
+        if self._words is None:
+            self._words = SpellChecker._find_words(self.text)
+        return self._words
@@ -0,0 +1,57 @@
+import os
+import gc
+from server import memory_report
+
+# gunicorn -c gunicorn_config.py api:app
+#
+# Master loads NLTK resources, models and spelling dictionary once (preload_app),
+# freezes them and forks workers, which share their memory pages copy-on-write.
+# Freezing moves loaded objects to permanent generation of garbage collector,
+# so collections in workers do not write to them and do not unshare pages.
+# Models are memory-mapped files and are shared by page cache anyway.
+#
+# Every worker has its own metrics, model registry, result cache and jobs,
+# so /metrics, /models, /cache and /jobs report the worker which served the request.
+
+bind = '{}:{}'.format(os.environ.get('HOST', '127.0.0.1'), os.environ.get('PORT', 5000))
+# number of worker processes, number of CPUs by default, and request threads of every worker
+workers = int(os.environ.get('WORKERS', 0)) or os.cpu_count() or 1
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 8))
+# seconds after which silent worker is restarted and seconds given to finish requests on reload
+timeout = int(os.environ.get('TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+# restart worker after that number of requests, 0 disables restarts
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+backlog = 2048
+preload_app = True
+
+# api preloads everything on import, set PRELOAD=0 to load in every worker on first use
+os.environ.setdefault('PRELOAD', '1')
+# avoid holes in pages of objects which live as long as master
+gc.disable()
+
+
+def when_ready(server):
+    import api
+    master_pid = os.getpid()
+
+    @api.app.route('/memory')
+    @api.logger_exception
+    def memory():
+        return api.jsonify(memory_report(master_pid))
+
+    # move everything loaded to permanent generation, it is never collected
+    gc.freeze()
+    gc.enable()
+
+
+def pre_fork(server, worker):
+    # objects created by master since the last fork, e.g. when dead worker is restarted
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import api
+    api.after_fork()
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """
+    Raised when number of not finished jobs reached the limit
+    """
+
+
+class JobQueue:
+    """
+    Queue of long-running jobs stored in SQLite and run by local pool of threads.
+    Job is submitted with kind and JSON payload, handler registered for kind
+    is called with payload and its JSON serializable return value is job result.
+    Jobs can be polled from any process that uses the same database.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, db_path='jobs.sqlite3', workers=2, max_pending=100):
+        """
+        :param db_path: string path to SQLite database
+        :param workers: int number of jobs run at the same time
+        :param max_pending: int max number of queued and running jobs of this process
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.handlers = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._finished = threading.Condition()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT, payload TEXT, status TEXT, result TEXT, error TEXT, '
+            'owner INTEGER, created REAL, started REAL, finished REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        self._executor = ThreadPoolExecutor(workers)
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def register(self, kind, handler):
+        """
+        Register handler of jobs
+        :param kind: string kind of jobs
+        :param handler: function that takes payload and returns result
+        """
+        self.handlers[kind] = handler
+
+    def submit(self, kind, payload):
+        """
+        Add job to queue
+        :param kind: string kind of job
+        :param payload: JSON serializable payload passed to handler
+        :return: string job id
+        :raises QueueFull: when there are too many not finished jobs
+        """
+        if kind not in self.handlers:
+            raise ValueError('Unknown kind of job: {}'.format(kind))
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull('{} jobs are waiting'.format(self._pending))
+            self._pending += 1
+        job_id = uuid.uuid4().hex
+        try:
+            self._execute(
+                'INSERT INTO jobs (id, kind, payload, status, owner, created) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(payload), self.QUEUED, os.getpid(), time.time())
+            )
+        except Exception:
+            # job was not stored, release its place in queue
+            with self._lock:
+                self._pending -= 1
+            raise
+        self._executor.submit(self._run, job_id, kind, payload)
+        return job_id
+
+    def _run(self, job_id, kind, payload):
+        """
+        Run job and store its result
+        """
+        self._execute('UPDATE jobs SET status = ?, started = ? WHERE id = ?', (self.RUNNING, time.time(), job_id))
+        try:
+            result = self.handlers[kind](payload)
+            self._execute(
+                'UPDATE jobs SET status = ?, result = ?, finished = ? WHERE id = ?',
+                (self.DONE, json.dumps(result), time.time(), job_id)
+            )
+        except Exception as e:
+            logger.exception('Job {} of kind "{}" failed'.format(job_id, kind))
+            self._execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?',
+                (self.FAILED, str(e) or e.__class__.__name__, time.time(), job_id)
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+            with self._finished:
+                self._finished.notify_all()
+
+    def recover(self):
+        """
+        Take over jobs of processes that are not running anymore:
+        queued jobs are run again, jobs that were running are failed
+        """
+        owners = [row[0] for row in self._execute(
+            'SELECT DISTINCT owner FROM jobs WHERE status IN (?, ?)', (self.QUEUED, self.RUNNING)
+        )]
+        for owner in owners:
+            if owner == os.getpid() or self._is_alive(owner):
+                continue
+            self._execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? WHERE owner = ? AND status = ?',
+                (self.FAILED, 'Worker stopped while job was running', time.time(), owner, self.RUNNING)
+            )
+            self._execute(
+                'UPDATE jobs SET owner = ? WHERE owner = ? AND status = ?', (os.getpid(), owner, self.QUEUED)
+            )
+        rows = self._execute(
+            'SELECT id, kind, payload FROM jobs WHERE owner = ? AND status = ?', (os.getpid(), self.QUEUED)
+        )
+        for job_id, kind, payload in rows:
+            with self._lock:
+                self._pending += 1
+            self._executor.submit(self._run, job_id, kind, json.loads(payload))
+
+    @staticmethod
+    def _is_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def get(self, job_id):
+        """
+        Get job
+        :param job_id: string job id
+        :return: dict or None if job does not exist
+        """
+        rows = self._execute(
+            'SELECT id, kind, status, result, error, created, started, finished FROM jobs WHERE id = ?',
+            (job_id, )
+        )
+        if not rows:
+            return None
+        job_id, kind, status, result, error, created, started, finished = rows[0]
+        return {
+            'id': job_id,
+            'kind': kind,
+            'status': status,
+            'result': json.loads(result) if result is not None else None,
+            'error': error,
+            'created': created,
+            'wait_time': started - created if started else None,
+            'run_time': finished - started if finished and started else None,
+        }
+
+    def wait(self, job_id, timeout):
+        """
+        Wait until job is finished or timeout expires (long polling)
+        :param job_id: string job id
+        :param timeout: float max number of seconds to wait
+        :return: dict or None if job does not exist
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in (self.DONE, self.FAILED) or remaining <= 0:
+                return job
+            # job can be run by other process, so check database from time to time
+            with self._finished:
+                self._finished.wait(min(remaining, 0.5))
+
+    def stats(self, last=100):
+        """
+        Queue depth and latency of the last finished jobs
+        :param last: int number of finished jobs used for latency
+        :return: dict
+        """
+        counts = dict(self._execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+        latency = self._execute(
+            'SELECT AVG(started - created), MAX(started - created), AVG(finished - started), '
+            'MAX(finished - started) FROM (SELECT * FROM jobs WHERE finished IS NOT NULL '
+            'AND started IS NOT NULL ORDER BY finished DESC LIMIT ?)', (last, )
+        )[0]
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'queued': counts.get(self.QUEUED, 0),
+            'running': counts.get(self.RUNNING, 0),
+            'done': counts.get(self.DONE, 0),
+            'failed': counts.get(self.FAILED, 0),
+            'wait_time': {'avg': latency[0], 'max': latency[1]},
+            'run_time': {'avg': latency[2], 'max': latency[3]},
+        }
@@ -0,0 +1,313 @@
+import sys
+import time
+import bisect
+import threading
+from functools import wraps
+from collections import Counter as StackCounter, deque
+
+
+# upper bounds of latency buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """
+    Monotonic counter with labels
+    """
+    TYPE = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """
+        Increase counter
+        :param labels: values of labels
+        :param amount: number added to counter
+        """
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self.values.items())
+        for labels, value in sorted(values):
+            yield '{}{} {}'.format(self.name, _labels(self.labelnames, labels), value)
+
+
+class Histogram:
+    """
+    Histogram of observed values with labels, e.g. latencies
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [counts of buckets (last is +Inf), sum]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """
+        Record value
+        :param value: float value
+        :param labels: values of labels
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        for labels, counts, total in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf', ), counts):
+                cumulative += count
+                yield '{}_bucket{} {}'.format(
+                    self.name, _labels(self.labelnames, labels, 'le="{}"'.format(bound)), cumulative
+                )
+            yield '{}_sum{} {}'.format(self.name, _labels(self.labelnames, labels), total)
+            yield '{}_count{} {}'.format(self.name, _labels(self.labelnames, labels), cumulative)
+
+
+class Metrics:
+    """
+    Process-wide metrics rendered in Prometheus text format
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, description, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = self.metrics[name] = cls(name, description, labelnames, **kwargs)
+        return metric
+
+    def counter(self, name, description, labelnames=()):
+        """
+        Get or create counter
+        :return: Counter
+        """
+        return self._get(Counter, name, description, labelnames)
+
+    def histogram(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Get or create histogram
+        :return: Histogram
+        """
+        return self._get(Histogram, name, description, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        All metrics in Prometheus text format
+        :return: string
+        """
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append('# HELP {} {}'.format(name, metric.description))
+            lines.append('# TYPE {} {}'.format(name, metric.TYPE))
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+request_duration = metrics.histogram(
+    'request_duration_seconds', 'Duration of requests by endpoint and status', ('endpoint', 'status')
+)
+stage_duration = metrics.histogram('stage_duration_seconds', 'Duration of stages of requests', ('stage', ))
+
+
+class timed:
+    """
+    Context manager and decorator. Records duration of stage
+    """
+    __slots__ = ('stage', 'start_time')
+
+    def __init__(self, stage):
+        """
+        :param stage: string stage name
+        """
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stage_duration.observe(time.perf_counter() - self.start_time, self.stage)
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage_duration.observe(time.perf_counter() - start_time, stage)
+        return wrapper
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of slow requests. When enabled, a background thread
+    samples stacks of threads handling requests every interval and profiles
+    of requests slower than threshold are kept as collapsed stacks
+    (input of flame graph tools). Disabled profiler costs one attribute check per request.
+    """
+
+    def __init__(self, threshold=1.0, interval=0.005, keep=20):
+        """
+        :param threshold: float min duration in seconds of kept request profiles
+        :param interval: float seconds between samples
+        :param keep: int number of kept profiles of recent slow requests
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.enabled = False
+        self.profiles = deque(maxlen=keep)
+        self._enabled = threading.Event()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, threshold=None):
+        """
+        Enable profiler
+        :param threshold: float min duration in seconds of kept request profiles
+        """
+        if threshold is not None:
+            self.threshold = threshold
+        with self._lock:
+            self.enabled = True
+            self._enabled.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """
+        Disable profiler, kept profiles are not removed
+        """
+        with self._lock:
+            self.enabled = False
+            self._enabled.clear()
+            self._active.clear()
+
+    def after_fork(self):
+        """
+        Start sampling thread again in forked process, threads are not copied by fork
+        """
+        with self._lock:
+            self._thread = None
+            self._active.clear()
+        if self.enabled:
+            self.start()
+
+    def begin(self, name):
+        """
+        Start profiling request handled by current thread
+        :param name: string endpoint name
+        :return: token passed to end or None if profiler is disabled
+        """
+        if not self.enabled:
+            return None
+        thread_id = threading.get_ident()
+        token = (thread_id, name, StackCounter())
+        with self._lock:
+            self._active[thread_id] = token
+        return token
+
+    def end(self, token, duration):
+        """
+        Stop profiling request and keep profile if request was slow
+        :param token: token returned by begin
+        :param duration: float duration of request in seconds
+        """
+        if token is None:
+            return
+        thread_id, name, stacks = token
+        with self._lock:
+            if self._active.get(thread_id) is token:
+                del self._active[thread_id]
+            # sampling thread does not change stacks of ended request
+            stacks = stacks.copy()
+        if duration >= self.threshold:
+            self.profiles.append({
+                'endpoint': name,
+                'duration': duration,
+                'finished': time.time(),
+                'samples': sum(stacks.values()),
+                'stacks': ['{} {}'.format(stack, count) for stack, count in stacks.most_common()],
+            })
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{}:{}'.format(code.co_filename.rsplit('/', 1)[-1], code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while True:
+            # sleep without waking up while profiler is disabled
+            self._enabled.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            samples = [(token, self._collapse(frames[token[0]])) for token in active if token[0] in frames]
+            del frames
+            with self._lock:
+                for token, stack in samples:
+                    # request can end while its stack is collapsed
+                    if self._active.get(token[0]) is token:
+                        token[2][stack] += 1
+
+    def stats(self):
+        """
+        Settings and kept profiles
+        :return: dict
+        """
+        return {
+            'enabled': self.enabled,
+            'threshold': self.threshold,
+            'interval': self.interval,
+            'profiles': list(self.profiles),
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,561 @@
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+import pickle
+import hashlib
+import numpy as np
+from scipy import sparse
+from scipy.special import expit
+import metrics
+from utils import tokenize
+
+
+MAGIC = b'SENTMODL'
+VERSION = 1
+# magic, version, byte order, size of JSON metadata, size of arrays, SHA256 of metadata and arrays
+HEADER = struct.Struct('<8sHHIQ32s')
+# arrays start at multiples of cache line
+ALIGNMENT = 64
+EXTENSION = '.model'
+
+
+def _padding(size):
+    return -size % ALIGNMENT
+
+
+def save(path, kind, arrays, meta):
+    """
+    Write model file: header, JSON metadata and aligned arrays
+    :param path: string path to file
+    :param kind: string kind of model
+    :param arrays: dict name -> numpy array
+    :param meta: JSON serializable dict of model parameters
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[name] = {'dtype': array.dtype.str, 'shape': array.shape, 'offset': offset}
+        offset += array.nbytes + _padding(array.nbytes)
+    data_size = offset
+    meta_bytes = json.dumps({'kind': kind, 'arrays': layout, 'meta': meta}).encode('utf-8')
+    meta_bytes += b' ' * _padding(HEADER.size + len(meta_bytes))
+    sha256 = hashlib.sha256(meta_bytes)
+    chunks = []
+    for name, array in arrays.items():
+        chunk = np.ascontiguousarray(array).tobytes()
+        chunk += b'\0' * _padding(len(chunk))
+        sha256.update(chunk)
+        chunks.append(chunk)
+    header = HEADER.pack(MAGIC, VERSION, sys.byteorder == 'little', len(meta_bytes), data_size, sha256.digest())
+    # write to temporary file, so running workers never map half-written model
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(meta_bytes)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def read(path, verify=True):
+    """
+    Map model file to memory
+    :param path: string path to file
+    :param verify: bool check SHA256 of file
+    :return: tuple of kind, dict name -> read-only numpy array backed by file and dict of metadata
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, little_endian, meta_size, data_size, digest = HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a model file of version {}'.format(path, VERSION))
+    if bool(little_endian) != (sys.byteorder == 'little'):
+        raise ValueError('{} was saved on platform with different byte order'.format(path))
+    if len(mapped) != HEADER.size + meta_size + data_size:
+        raise ValueError('{} is truncated'.format(path))
+    if verify and hashlib.sha256(memoryview(mapped)[HEADER.size:]).digest() != digest:
+        raise ValueError('Checksum of {} does not match'.format(path))
+    description = json.loads(bytes(mapped[HEADER.size:HEADER.size + meta_size]))
+    data_offset = HEADER.size + meta_size
+    arrays = {}
+    for name, layout in description['arrays'].items():
+        dtype = np.dtype(layout['dtype'])
+        count = int(np.prod(layout['shape']))
+        arrays[name] = np.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_offset + layout['offset']
+        ).reshape(layout['shape'])
+    return description['kind'], arrays, description['meta']
+
+
+def _encode_terms(terms):
+    """
+    Join terms to one array of bytes
+    :param terms: list of strings
+    :return: numpy array of uint8
+    """
+    if any('\0' in term for term in terms):
+        raise ValueError('Terms can not contain null character')
+    return np.frombuffer('\0'.join(terms).encode('utf-8'), dtype=np.uint8)
+
+
+def _decode_terms(array, count):
+    if not count:
+        return []
+    return array.tobytes().decode('utf-8').split('\0')
+
+
+class Vocabulary:
+    """
+    Terms of model stored in file, dict of ids is built on first use
+    """
+
+    def __init__(self, array, count):
+        """
+        :param array: numpy array of utf-8 terms separated by null character
+        :param count: int number of terms
+        """
+        self.array = array
+        self.count = count
+        self._ids = None
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = {term: i for i, term in enumerate(_decode_terms(self.array, self.count))}
+        return self._ids
+
+    def get(self, term, default=None):
+        return self.ids.get(term, default)
+
+    def __contains__(self, term):
+        return term in self.ids
+
+    def __getitem__(self, term):
+        return self.ids[term]
+
+    def __len__(self):
+        return self.count
+
+
+class TfidfTransform:
+    """
+    Inference part of sklearn TfidfVectorizer for word unigrams
+    """
+
+    def __init__(self, vocabulary, idf, lowercase=True, token_pattern=r'(?u)\b\w\w+\b', binary=False,
+                 sublinear_tf=False, norm='l2'):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.lowercase = lowercase
+        self.token_pattern = re.compile(token_pattern)
+        self.binary = binary
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+
+    def transform(self, documents):
+        """
+        TF-IDF vectors of documents
+        :param documents: list of string texts
+        :return: sparse matrix (documents x terms)
+        """
+        indptr, indices, counts = [0], [], []
+        vocabulary = self.vocabulary.ids
+        for document in documents:
+            if self.lowercase:
+                document = document.lower()
+            document_counts = {}
+            for token in self.token_pattern.findall(document):
+                term_id = vocabulary.get(token)
+                if term_id is not None:
+                    document_counts[term_id] = document_counts.get(term_id, 0) + 1
+            indices.extend(document_counts)
+            counts.extend(document_counts.values())
+            indptr.append(len(indices))
+        values = np.array(counts, dtype=np.float64)
+        if self.binary:
+            values[:] = 1
+        elif self.sublinear_tf:
+            values = np.log(values) + 1
+        matrix = sparse.csr_matrix((values, indices, indptr), shape=(len(indptr) - 1, len(self.vocabulary)))
+        if self.idf is not None:
+            matrix = matrix @ sparse.diags(self.idf)
+        if self.norm:
+            if self.norm == 'l2':
+                norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            else:
+                norms = np.asarray(abs(matrix).sum(axis=1)).ravel()
+            norms[norms == 0] = 1
+            matrix = sparse.diags(1 / norms) @ matrix
+        return sparse.csr_matrix(matrix)
+
+
+class LinearModel:
+    """
+    Inference part of sklearn linear classifier
+    """
+
+    def __init__(self, coef, intercept, classes):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.classes_ = np.array(classes)
+
+    def decision_function(self, vectors):
+        return np.asarray(vectors @ self.coef_.T).ravel() + self.intercept_[0]
+
+    def predict(self, vectors):
+        return self.classes_[(self.decision_function(vectors) > 0).astype(int)]
+
+
+class LinearScorer:
+    """
+    TF-IDF of word unigrams and linear classifier folded into tables of terms.
+    Decision of document is sum of tf * idf * coef of its terms divided by
+    its norm (sqrt of sum of (tf * idf)^2 for l2) plus intercept, so scoring
+    needs only dict lookups of tokens and sums of table values. Decisions
+    of documents made of one known term (e.g. every word scored separately)
+    are computed in advance and looked up without tokenization.
+    """
+
+    def __init__(self, vocabulary, idf, coef, intercept, lowercase=True, token_pattern=r'(?u)\b\w\w+\b',
+                 binary=False, sublinear_tf=False, norm='l2'):
+        """
+        :param vocabulary: dict term -> id
+        :param idf: numpy array of idf of terms or None
+        :param coef: numpy array of coefficients of terms for positive label
+        :param intercept: float intercept for positive label
+        """
+        self.vocabulary = vocabulary
+        self.lowercase = lowercase
+        self.token_pattern = re.compile(token_pattern)
+        self.binary = binary
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        idf = np.ones(len(coef)) if idf is None else np.asarray(idf, dtype=np.float64)
+        self.idf = idf
+        self.weights = idf * coef
+        self.intercept = float(intercept)
+        # term frequency of one term is 1 in every mode, normalization leaves only coef
+        self.single_decisions = (np.asarray(coef, dtype=np.float64) if norm else self.weights) + self.intercept
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        """
+        Compile classifier with TF-IDF of word unigrams
+        :param classifier: SVMClassifier or CompactSVMClassifier
+        :return: LinearScorer
+        """
+        vectorizer = classifier.vectorizer
+        if isinstance(vectorizer, TfidfTransform):
+            vocabulary = vectorizer.vocabulary.ids
+            idf = vectorizer.idf
+            params = {
+                'lowercase': vectorizer.lowercase,
+                'token_pattern': vectorizer.token_pattern.pattern,
+                'binary': vectorizer.binary,
+                'sublinear_tf': vectorizer.sublinear_tf,
+                'norm': vectorizer.norm,
+            }
+        else:
+            _check_vectorizer(vectorizer)
+            vocabulary = vectorizer.vocabulary_
+            idf = vectorizer.idf_ if vectorizer.use_idf else None
+            params = {name: getattr(vectorizer, name)
+                      for name in ('lowercase', 'token_pattern', 'binary', 'sublinear_tf', 'norm')}
+        linear_model = classifier.classifier
+        coef = np.asarray(linear_model.coef_, dtype=np.float64)[0]
+        intercept = linear_model.intercept_[0]
+        # decision function is positive for the second class
+        if linear_model.classes_[1] != 'pos':
+            coef, intercept = -coef, -intercept
+        return cls(vocabulary, idf, coef, intercept, **params)
+
+    def decision_function(self, documents):
+        """
+        Decision function of documents, positive for 'pos' label
+        :param documents: list of string texts
+        :return: numpy array
+        """
+        vocabulary = self.vocabulary
+        decision = np.full(len(documents), self.intercept)
+        single_doc_ids, single_term_ids = [], []
+        doc_ids, term_ids = [], []
+        for i, document in enumerate(documents):
+            if self.lowercase:
+                document = document.lower()
+            term_id = vocabulary.get(document)
+            if term_id is not None:
+                # whole document is one term
+                single_doc_ids.append(i)
+                single_term_ids.append(term_id)
+                continue
+            for token in self.token_pattern.findall(document):
+                term_id = vocabulary.get(token)
+                if term_id is not None:
+                    doc_ids.append(i)
+                    term_ids.append(term_id)
+        if single_term_ids:
+            decision[single_doc_ids] = self.single_decisions[single_term_ids]
+        if not term_ids:
+            return decision
+        # count every term of document once
+        pairs, counts = np.unique(
+            np.array(doc_ids, dtype=np.int64) * len(self.weights) + np.array(term_ids, dtype=np.int64),
+            return_counts=True
+        )
+        doc_ids, term_ids = np.divmod(pairs, len(self.weights))
+        tf = counts.astype(np.float64)
+        if self.binary:
+            tf[:] = 1
+        elif self.sublinear_tf:
+            tf = np.log(tf) + 1
+        scores = np.bincount(doc_ids, tf * self.weights[term_ids], minlength=len(documents))
+        if self.norm == 'l2':
+            norms = np.sqrt(np.bincount(doc_ids, (tf * self.idf[term_ids]) ** 2, minlength=len(documents)))
+        elif self.norm:
+            norms = np.bincount(doc_ids, tf * self.idf[term_ids], minlength=len(documents))
+        else:
+            norms = np.ones(len(documents))
+        norms[norms == 0] = 1
+        return decision + scores / norms
+
+    def predict_prob(self, documents):
+        """
+        Probabilities of 'pos' label
+        :param documents: list of string texts
+        :return: numpy array of probabilities
+        """
+        return expit(self.decision_function(documents))
+
+
+def binary_matrix(indices, indptr, n_features):
+    """
+    Sparse binary matrix of documents, feature present many times in document counts once
+    :param indices: list of feature ids of all documents
+    :param indptr: list of offsets of documents in indices
+    :param n_features: int number of features
+    :return: CSR matrix (documents x features)
+    """
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices)), indices, indptr), shape=(len(indptr) - 1, n_features)
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def naive_bayes_probabilities(matrix, feature_log_probs, label_log_probs):
+    """
+    Label probabilities of documents
+    :param matrix: sparse binary matrix (documents x features)
+    :param feature_log_probs: matrix of base 2 log probabilities of features (labels x features)
+    :param label_log_probs: vector of base 2 log probabilities of labels
+    :return: matrix of probabilities (documents x labels)
+    """
+    scores = matrix @ feature_log_probs.T + label_log_probs
+    scores -= scores.max(axis=1, keepdims=True)
+    probabilities = np.exp2(scores)
+    return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+class CompactSVMClassifier:
+    """
+    SVM classifier loaded from model file. Predicts pos/neg label for words as SVMClassifier.
+    Documents are scored by LinearScorer compiled on first use.
+    """
+
+    def __init__(self, vectorizer, classifier):
+        self.vectorizer = vectorizer
+        self.classifier = classifier
+        self.classes = ['pos', 'neg']
+        self._scorer = None
+
+    @property
+    def scorer(self):
+        if self._scorer is None:
+            self._scorer = LinearScorer.from_classifier(self)
+        return self._scorer
+
+    def predict(self, data):
+        """
+        Predict label
+        :param data: string text
+        :return: list of predicted labels
+        """
+        # probability predict 'pos' class
+        return self.batch_predict_prob(data).tolist()
+
+    @metrics.timed('svm_predict')
+    def batch_predict_prob(self, documents, batch_size=100000):
+        """
+        Probabilities of 'pos' label for many documents at once
+        :param documents: list of string texts
+        :param batch_size: int number of documents scored together
+        :return: numpy array of probabilities
+        """
+        probabilities = [
+            self.scorer.predict_prob(documents[start:start + batch_size])
+            for start in range(0, len(documents), batch_size)
+        ]
+        if not probabilities:
+            return np.empty(0)
+        return np.concatenate(probabilities)
+
+
+class NaiveBayesScoring:
+    """
+    Predictions of naive Bayes classifier computed with one sparse matrix product.
+    Subclasses provide tokenize(text) and _log_prob_tables(), that returns labels,
+    dict feature -> id, matrix of base 2 log probabilities of features (labels x features)
+    and vector of base 2 log probabilities of labels.
+    """
+
+    @metrics.timed('naive_bayes_predict')
+    def _batch_probabilities(self, documents, tokenized=False):
+        """
+        Label probabilities of documents computed with one sparse matrix product
+        :param documents: iterable of string texts
+        :param tokenized: bool documents are already lists of tokens
+        :return: tuple of labels and matrix of probabilities (documents x labels)
+        """
+        labels, features, feature_log_probs, label_log_probs = self._log_prob_tables()
+        indptr, indices = [0], []
+        for document in documents:
+            tokens = document if tokenized else self.tokenize(document)
+            # table has only features of model (no stop words, only best words),
+            # features not seen in training are ignored as in NLTK
+            indices.extend(features[f] for f in tokens if f in features)
+            indptr.append(len(indices))
+        matrix = binary_matrix(indices, indptr, len(features))
+        return labels, naive_bayes_probabilities(matrix, feature_log_probs, label_log_probs)
+
+    def batch_predict_prob(self, documents, tokenized=False):
+        """
+        Probabilities of 'pos' label for many documents at once
+        :param documents: iterable of string texts
+        :param tokenized: bool documents are already lists of tokens
+        :return: numpy array of probabilities
+        """
+        labels, probabilities = self._batch_probabilities(documents, tokenized)
+        return probabilities[:, labels.index('pos')]
+
+    def predict(self, data):
+        """
+        Predict label for text
+        :param data: string text
+        :return: list of labels
+        """
+        labels, probabilities = self._batch_probabilities(data)
+        return [labels[i] for i in probabilities.argmax(axis=1)]
+
+    def predict_prob(self, data, tokenized=False):
+        """
+        Prediction probabilities
+        :param data: string text
+        :param tokenized: bool items of data are already lists of tokens
+        :return: list of probabilities
+        """
+        preds = [p for p in self.batch_predict_prob(data, tokenized).tolist() if p != 0.5]
+        return preds
+
+
+class CompactBayesClassifier(NaiveBayesScoring):
+    """
+    Naive Bayes classifier loaded from model file. Predicts pos/neg label for words as BayesClassifier.
+    Features not seen in training are ignored, so both feature models
+    reduce to the words of text present in the table.
+    """
+
+    def __init__(self, model, labels, features, feature_log_probs, label_log_probs):
+        self.model = model
+        self.classes = ['pos', 'neg']
+        self._tables = labels, features, feature_log_probs, label_log_probs
+
+    def _log_prob_tables(self):
+        return self._tables
+
+    tokenize = staticmethod(tokenize)
+
+
+def _check_vectorizer(vectorizer):
+    """
+    Check that vectorizer is fitted TF-IDF of word unigrams
+    :param vectorizer: sklearn vectorizer
+    :raises ValueError: for other vectorizers
+    """
+    params = vectorizer.get_params() if vectorizer is not None else {}
+    if not hasattr(vectorizer, 'vocabulary_') or params['analyzer'] != 'word' or params['ngram_range'] != (1, 1) or \
+            params['preprocessor'] or params['tokenizer'] or params['strip_accents']:
+        raise ValueError('Only classifiers with TF-IDF of word unigrams are supported')
+
+
+def export(classifier, path):
+    """
+    Save inference part of trained classifier
+    :param classifier: SVMClassifier or BayesClassifier
+    :param path: string path to model file
+    """
+    # training dependencies are not needed to load model files
+    from classifiers import BayesClassifier
+    if isinstance(classifier, BayesClassifier):
+        labels, features, feature_log_probs, label_log_probs = classifier._log_prob_tables()
+        terms = sorted(features, key=features.get)
+        save(path, 'naive_bayes', {
+            'features': _encode_terms(terms),
+            'feature_log_probs': feature_log_probs,
+            'label_log_probs': label_log_probs,
+        }, {'model': classifier.model, 'labels': labels, 'features': len(terms)})
+        return
+    vectorizer = getattr(classifier, 'vectorizer', None)
+    _check_vectorizer(vectorizer)
+    params = vectorizer.get_params()
+    vocabulary = vectorizer.vocabulary_
+    terms = sorted(vocabulary, key=vocabulary.get)
+    linear_model = classifier.classifier
+    save(path, 'svm', {
+        'terms': _encode_terms(terms),
+        'idf': vectorizer.idf_ if params['use_idf'] else np.ones(len(terms)),
+        'coef': linear_model.coef_,
+        'intercept': linear_model.intercept_,
+    }, {
+        'terms': len(terms),
+        'classes': [str(c) for c in linear_model.classes_],
+        'lowercase': params['lowercase'],
+        'token_pattern': params['token_pattern'],
+        'binary': params['binary'],
+        'sublinear_tf': params['sublinear_tf'],
+        'norm': params['norm'],
+    })
+
+
+def load(path, verify=True):
+    """
+    Load classifier from model file
+    :param path: string path to model file
+    :param verify: bool check SHA256 of file
+    :return: CompactSVMClassifier or CompactBayesClassifier
+    """
+    kind, arrays, meta = read(path, verify)
+    if kind == 'naive_bayes':
+        features = Vocabulary(arrays['features'], meta['features'])
+        return CompactBayesClassifier(
+            meta['model'], meta['labels'], features, arrays['feature_log_probs'], arrays['label_log_probs']
+        )
+    if kind == 'svm':
+        vectorizer = TfidfTransform(
+            Vocabulary(arrays['terms'], meta['terms']), arrays['idf'], meta['lowercase'], meta['token_pattern'],
+            meta['binary'], meta['sublinear_tf'], meta['norm']
+        )
+        return CompactSVMClassifier(vectorizer, LinearModel(arrays['coef'], arrays['intercept'], meta['classes']))
+    raise ValueError('Unknown kind of model: {}'.format(kind))
+
+
+if __name__ == '__main__':
+    # python model_format.py svm.pickle [svm.model]
+    source = sys.argv[1]
+    with open(source, 'rb') as f:
+        model = pickle.load(f)
+    export(model, sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + EXTENSION)
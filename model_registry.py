@@ -0,0 +1,233 @@
+import os
+import sys
+import time
+import types
+import pickle
+import hashlib
+import logging
+import threading
+import numpy as np
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def object_size(obj):
+    """
+    Memory of object and all objects it refers to, every object is counted once.
+    Arrays of mapped files take no memory
+    :param obj: object
+    :return: int number of bytes
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType,
+                                                types.BuiltinFunctionType, types.MethodType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        # size of array includes its data only when array owns it, views
+        # are counted by their base, that is mmap object for mapped files
+        if isinstance(obj, np.ndarray):
+            if obj.base is not None:
+                stack.append(obj.base)
+            continue
+        if isinstance(obj, memoryview):
+            stack.append(obj.obj)
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return size
+
+
+class ModelEntry:
+    """
+    Loaded model together with the data used to detect changes on disk.
+    """
+
+    def __init__(self, name, paths):
+        """
+        :param name: string model name
+        :param paths: string path to model or tuple of paths, the first existing one is loaded
+        """
+        self.name = name
+        self.paths = (paths, ) if isinstance(paths, str) else tuple(paths)
+        self.model = None
+        self.loaded_path = None
+        # 'compiled' for model files (see model_format), 'pickle' for pickled classifiers
+        self.scoring = None
+        self.mtime = None
+        self.size = None
+        self.digest = None
+        self.load_time = None
+        self.memory = None
+        self.loaded_at = None
+        self.loads = 0
+
+    @property
+    def path(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                return path
+        return self.paths[-1]
+
+    def stats(self):
+        """
+        Statistics of loaded model
+        :return: dict
+        """
+        return {
+            'path': self.path,
+            'loaded': self.model is not None,
+            'scoring': self.scoring,
+            'sha1': self.digest,
+            'load_time': self.load_time,
+            'memory': self.memory,
+            'loaded_at': self.loaded_at,
+            'loads': self.loads,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of models stored in model files (see model_format)
+    or pickles. Loads every model once and shares it between request threads.
+    Model is reloaded when mtime of file changed and its hash differs.
+    Loaded models must be used read-only.
+    """
+
+    def __init__(self, models=None, check_interval=1.0):
+        """
+        :param models: dict name -> path or tuple of paths to model file or pickle
+        :param check_interval: float minimal number of seconds between checks of files on disk
+        """
+        if models is None:
+            models = {
+                'naive_bag_of_words': ('naive_bag_of_words.model', 'naive_bag_of_words.pickle'),
+                'naive_best_words': ('naive_best_words.model', 'naive_best_words.pickle'),
+                'svm': ('svm.model', 'svm.pickle'),
+            }
+        self.check_interval = check_interval
+        self.entries = {name: ModelEntry(name, path) for name, path in models.items()}
+        self._last_check = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _file_digest(path):
+        """
+        SHA1 of file content
+        :param path: string path
+        :return: string hex digest
+        """
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def _load(entry, path, digest, stat):
+        """
+        Load model and measure load time and memory.
+        Arrays of model files are mapped, so they are not counted in memory
+        :param entry: ModelEntry
+        :param path: string path to model
+        :param digest: string hex digest of file
+        :param stat: os.stat_result of file
+        """
+        # model files need only numpy and scipy, classifiers import sklearn and NLTK
+        import model_format
+        start_time = time.perf_counter()
+        if path.endswith(model_format.EXTENSION):
+            model = model_format.load(path)
+            scoring = 'compiled'
+        else:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            scoring = 'pickle'
+        load_time = time.perf_counter() - start_time
+        if scoring == 'pickle' and any(p.endswith(model_format.EXTENSION) for p in entry.paths):
+            logger.warning('Model file of {} is missing, {} is scored by slow pickle path, '
+                           'export it with model_format'.format(entry.name, path))
+        else:
+            logger.info('Model {} loaded from {}, {} scoring'.format(entry.name, path, scoring))
+        metrics.stage_duration.observe(load_time, 'model_load')
+        # tracemalloc would trace allocations of all threads of process
+        memory = object_size(model)
+        entry.model = model
+        entry.loaded_path = path
+        entry.scoring = scoring
+        entry.mtime = stat.st_mtime_ns
+        entry.size = stat.st_size
+        entry.digest = digest
+        entry.load_time = load_time
+        entry.memory = memory
+        entry.loaded_at = time.time()
+        entry.loads += 1
+
+    def _refresh(self, entry):
+        """
+        Load model or reload it if its file has changed
+        :param entry: ModelEntry
+        """
+        path = entry.path
+        stat = os.stat(path)
+        if entry.model is not None and (path, stat.st_mtime_ns, stat.st_size) == \
+                (entry.loaded_path, entry.mtime, entry.size):
+            return
+        digest = self._file_digest(path)
+        if entry.model is not None and (path, digest) == (entry.loaded_path, entry.digest):
+            # file was touched, but content is the same
+            entry.mtime = stat.st_mtime_ns
+            entry.size = stat.st_size
+            return
+        self._load(entry, path, digest, stat)
+
+    def get(self, name):
+        """
+        Get loaded model
+        :param name: string model name
+        :return: model
+        """
+        entry = self.entries[name]
+        now = time.monotonic()
+        if entry.model is not None and now - self._last_check.get(name, 0) < self.check_interval:
+            return entry.model
+        with self._lock:
+            self._refresh(entry)
+            self._last_check[name] = now
+        return entry.model
+
+    def version(self, names):
+        """
+        Version of loaded models, changes when any of models is reloaded
+        :param names: list of model names
+        :return: string
+        """
+        return '-'.join(self.entries[name].digest or '' for name in names)
+
+    def preload(self):
+        """
+        Load all models
+        """
+        for name in self.entries:
+            self.get(name)
+
+    def stats(self):
+        """
+        Load time, memory footprint and scoring path of every model
+        :return: dict
+        """
+        return {name: entry.stats() for name, entry in self.entries.items()}
+
+
+registry = ModelRegistry()
@@ -0,0 +1,146 @@
+import time
+import threading
+from contextlib import contextmanager
+import metrics
+
+
+class Resources:
+    """
+    NLTK resources shared by all users in process:
+    POS tagger, punkt sentence tokenizer and stopwords.
+    NLTK is imported and every resource is loaded once, on first use or by preload().
+    Load time of every startup phase is recorded in timings.
+    """
+
+    def __init__(self, language='english'):
+        self.language = language
+        self.timings = {}
+        self._resources = {}
+        self._lock = threading.RLock()
+        self._loaders = {
+            'pos_tagger': self._load_tagger,
+            'sentence_tokenizer': self._load_sentence_tokenizer,
+            'word_tokenizer': self._load_word_tokenizer,
+            'stopwords': self._load_stopwords,
+        }
+
+    @contextmanager
+    def timed(self, phase):
+        """
+        Context manager. Records duration of startup phase
+        :param phase: string phase name
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = time.perf_counter() - start_time
+
+    @staticmethod
+    def _load_tagger():
+        from nltk.tag.perceptron import PerceptronTagger
+        return PerceptronTagger()
+
+    def _load_sentence_tokenizer(self):
+        try:
+            # nltk >= 3.8.2 uses punkt_tab data
+            from nltk.tokenize import PunktTokenizer
+        except ImportError:
+            import nltk.data
+            return nltk.data.load('tokenizers/punkt/{}.pickle'.format(self.language))
+        return PunktTokenizer(self.language)
+
+    @staticmethod
+    def _load_word_tokenizer():
+        try:
+            from nltk.tokenize import NLTKWordTokenizer
+        except ImportError:
+            from nltk.tokenize import TreebankWordTokenizer as NLTKWordTokenizer
+        return NLTKWordTokenizer()
+
+    def _load_stopwords(self):
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words(self.language))
+
+    def get(self, name):
+        """
+        Get resource, load it on first use
+        :param name: string resource name
+        :return: resource
+        """
+        resource = self._resources.get(name)
+        if resource is None:
+            with self._lock:
+                resource = self._resources.get(name)
+                if resource is None:
+                    with self.timed(name), metrics.timed('resource_load'):
+                        resource = self._loaders[name]()
+                    self._resources[name] = resource
+        return resource
+
+    def preload(self):
+        """
+        Load all resources
+        """
+        with self.timed('nltk_import'):
+            import nltk
+        for name in self._loaders:
+            self.get(name)
+
+    def stats(self):
+        """
+        Loaded resources and startup phases timings
+        :return: dict
+        """
+        return {
+            'loaded': sorted(self._resources),
+            'timings': dict(self.timings),
+        }
+
+    @metrics.timed('sentence_tokenize')
+    def sent_tokenize(self, text):
+        """
+        Split text to sentences
+        :param text: string text
+        :return: list of sentences
+        """
+        return self.get('sentence_tokenizer').tokenize(text)
+
+    @metrics.timed('word_tokenize')
+    def word_tokenize(self, sent):
+        """
+        Split sentence to words, same as nltk.word_tokenize of one sentence
+        :param sent: string sentence
+        :return: list of words
+        """
+        return self.get('word_tokenizer').tokenize(sent)
+
+    @staticmethod
+    @metrics.timed('wordpunct_tokenize')
+    def wordpunct_tokenize(text):
+        """
+        Split text to alphabetic and non-alphabetic sequences of characters
+        :param text: string text
+        :return: list of tokens
+        """
+        from nltk.tokenize import wordpunct_tokenize
+        return wordpunct_tokenize(text)
+
+    @metrics.timed('pos_tag')
+    def pos_tag(self, tokens):
+        """
+        Tag tokens with part of speech
+        :param tokens: list of words
+        :return: list of (word, tag) tuples
+        """
+        return self.get('pos_tagger').tag(tokens)
+
+    def stopwords(self):
+        """
+        Stopwords of language
+        :return: frozenset of words
+        """
+        return self.get('stopwords')
+
+
+resources = Resources()
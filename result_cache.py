@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import threading
+import unicodedata
+from utils import LRUCache
+
+
+def normalize(text):
+    """
+    Normalize text, so equal texts get equal cache keys
+    :param text: string text
+    :return: string normalized text
+    """
+    return unicodedata.normalize('NFC', text).replace('\r\n', '\n').strip()
+
+
+def text_digest(text):
+    """
+    Hash of normalized text
+    :param text: string text
+    :return: string hex digest
+    """
+    return hashlib.sha256(normalize(text).encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    """
+    Hash of file content
+    :param path: string path to file
+    :return: string hex digest
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of endpoint results keyed by content hash of input and version of model.
+    Keeps recently used results in memory and, when directory is given,
+    every result on disk as JSON file.
+    """
+
+    def __init__(self, maxsize=1024, directory=None):
+        """
+        :param maxsize: int max number of results in memory
+        :param directory: string path to directory of disk cache, None disables it
+        """
+        self.memory = LRUCache(maxsize)
+        self.directory = directory
+        self.disk_hits = 0
+        self.disk_writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(namespace, version, digest):
+        """
+        Cache key
+        :param namespace: string endpoint name
+        :param version: string version of model used by endpoint
+        :param digest: string hash of input
+        :return: string key
+        """
+        return hashlib.sha256('{}\0{}\0{}'.format(namespace, version, digest).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, key):
+        """
+        Get cached result
+        :param key: string key
+        :return: tuple of result (None on miss) and cache status: HIT, DISK or MISS
+        """
+        result = self.memory.get(key)
+        if result is not None:
+            return result, 'HIT'
+        if self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None, 'MISS'
+            self.disk_hits += 1
+            self.memory.put(key, result)
+            return result, 'DISK'
+        return None, 'MISS'
+
+    def put(self, key, result):
+        """
+        Cache result
+        :param key: string key
+        :param result: JSON serializable result
+        """
+        self.memory.put(key, result)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to temporary file of this thread, so readers never see partial result
+            # and concurrent writers of the same key do not share temporary file
+            tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(result, f)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.disk_writes += 1
+
+    def get_or_compute(self, namespace, version, digest, compute):
+        """
+        Get cached result or compute and cache it
+        :param namespace: string endpoint name
+        :param version: string version of model used by endpoint
+        :param digest: string hash of input
+        :param compute: function without arguments that returns result
+        :return: tuple of result and cache status
+        """
+        key = self.key(namespace, version, digest)
+        result, status = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result, status
+
+    def stats(self):
+        """
+        Cache statistics
+        :return: dict
+        """
+        stats = self.memory.stats()
+        stats['disk'] = bool(self.directory)
+        stats['disk_hits'] = self.disk_hits
+        stats['disk_writes'] = self.disk_writes
+        return stats
@@ -0,0 +1,55 @@
+def memory_usage(pid='self'):
+    """
+    Memory of process read from /proc/<pid>/smaps_rollup (Linux)
+    :param pid: int process id
+    :return: dict of rss, pss, shared and unique (private) bytes or None if it is not available
+    """
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines[1:]:
+        name, value = line.split(':', 1)
+        parts = value.split()
+        if len(parts) == 2 and parts[1] == 'kB':
+            values[name] = int(parts[0]) * 1024
+    return {
+        'rss': values.get('Rss', 0),
+        # own pages and equal part of pages shared with other processes
+        'pss': values.get('Pss', 0),
+        'shared': values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0),
+        'unique': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def children(pid):
+    """
+    Ids of child processes (Linux)
+    :param pid: int process id
+    :return: list of ids
+    """
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_report(master_pid):
+    """
+    Memory of master and workers
+    :param master_pid: int process id of master
+    :return: dict
+    """
+    workers = {pid: memory_usage(pid) for pid in children(master_pid)}
+    workers = {pid: usage for pid, usage in workers.items() if usage is not None}
+    return {
+        'master': memory_usage(master_pid),
+        'workers': workers,
+        'total': {
+            'unique': sum(usage['unique'] for usage in workers.values()),
+            'pss': sum(usage['pss'] for usage in workers.values()),
+        },
+    }
@@ -1,17 +1,147 @@
 import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import speech_recognition as sr
 
 
-class SpeechToText:
+logger = logging.getLogger(__name__)
+
+
+def rms(fragment, sample_width):
+    """
+    Root mean square energy of fragment of audio as audioop.rms (removed in Python 3.13)
+    :param fragment: bytes of signed little-endian samples
+    :param sample_width: int bytes per sample, 1 to 4
+    :return: int RMS
+    """
+    samples = np.frombuffer(fragment, dtype=np.uint8, count=len(fragment) // sample_width * sample_width)
+    if not samples.size:
+        return 0
+    if sample_width == 3:
+        # 24-bit samples to high bytes of 32-bit integers, sign is kept by arithmetic shift
+        padded = np.zeros((samples.size // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = samples.reshape(-1, 3)
+        samples = padded.view('<i4').ravel() >> 8
+    else:
+        samples = samples.view({1: 'i1', 2: '<i2', 4: '<i4'}[sample_width])
+    samples = samples.astype(np.float64)
+    return int(np.sqrt(np.dot(samples, samples) / samples.size))
+
+
+class GoogleCloudBackend:
     """
     Recognize speech using Google Cloud Speech
     """
 
     def __init__(self, creds_file_path='creds.json'):
-        self.text = None
         self.creds = creds_file_path
         self.recognizer = sr.Recognizer()
 
+    def recognize(self, audio, language):
+        """
+        Recognize speech
+        :param audio: speech_recognition.AudioData
+        :param language: language
+        :return: text
+        """
+        return self.recognizer.recognize_google_cloud(
+            audio,
+            language=language,
+            credentials_json=open(self.creds).read()
+        )
+
+
+class SphinxBackend:
+    """
+    Recognize speech offline using CMU Sphinx (requires pocketsphinx)
+    """
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio, language):
+        """
+        Recognize speech
+        :param audio: speech_recognition.AudioData
+        :param language: language
+        :return: text
+        """
+        return self.recognizer.recognize_sphinx(audio, language=language)
+
+
+class SpeechToText:
+    """
+    Recognize speech using Google Cloud Speech or other backend.
+    Audio is split at silences into chunks, which are recognized concurrently.
+    """
+
+    def __init__(self, creds_file_path='creds.json', backend=None, workers=4,
+                 chunk_duration=15, max_chunk_duration=30, silence_threshold=300, window=0.03):
+        """
+        :param creds_file_path: string path to Google Cloud credentials
+        :param backend: object with recognize(audio, language) method,
+         which raises speech_recognition errors; GoogleCloudBackend by default
+        :param workers: int number of chunks recognized at the same time
+        :param chunk_duration: float seconds of audio after which chunk is cut at the next silence
+        :param max_chunk_duration: float seconds of audio after which chunk is cut anyway
+        :param silence_threshold: int max RMS energy of silent window
+        :param window: float seconds of audio checked for silence at once
+        """
+        self.text = None
+        self.backend = backend or GoogleCloudBackend(creds_file_path)
+        self.workers = workers
+        self.chunk_duration = chunk_duration
+        self.max_chunk_duration = max_chunk_duration
+        self.silence_threshold = silence_threshold
+        self.window = window
+        # timings of chunks of the last recognized audio
+        self.timings = []
+
+    def _chunks(self, source):
+        """
+        Generator. Reads audio source window by window and yields chunks
+        cut at silences
+        :param source: opened speech_recognition.AudioFile
+        :return: generator of tuples of start in seconds and AudioData
+        """
+        window_frames = max(1, int(source.SAMPLE_RATE * self.window))
+        frames, duration, start = [], 0.0, 0.0
+        while True:
+            buffer = source.stream.read(window_frames)
+            if not buffer:
+                break
+            frames.append(buffer)
+            duration += len(buffer) / source.SAMPLE_WIDTH / source.SAMPLE_RATE
+            silent = rms(buffer, source.SAMPLE_WIDTH) < self.silence_threshold
+            if (duration >= self.chunk_duration and silent) or duration >= self.max_chunk_duration:
+                yield start, sr.AudioData(b''.join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                start += duration
+                frames, duration = [], 0.0
+        if frames:
+            yield start, sr.AudioData(b''.join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+
+    def _recognize_chunk(self, index, start, audio, language):
+        """
+        Recognize chunk of audio
+        :return: tuple of text (empty if speech was not understood) and timing of chunk
+        """
+        start_time = time.perf_counter()
+        timing = {
+            'chunk': index,
+            'start': start,
+            'duration': len(audio.frame_data) / audio.sample_width / audio.sample_rate,
+        }
+        try:
+            text = self.backend.recognize(audio, language)
+        except sr.UnknownValueError:
+            text = ''
+        finally:
+            timing['time'] = time.perf_counter() - start_time
+        return text, timing
+
     def recognize(self, audio_file, language="en-US"):
         """
         Recognize speech from audio using Google Cloud Speech
@@ -21,17 +151,30 @@ class SpeechToText:
         """
         # use the audio file as the audio source
         audio_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), audio_file)
-        with sr.AudioFile(audio_path) as source:
-            audio = self.recognizer.record(source)
+        texts = []
+        self.timings = []
+        pending = deque()
+
+        def collect():
+            text, timing = pending.popleft().result()
+            texts.append(text)
+            self.timings.append(timing)
+
         try:
-            text = self.recognizer.recognize_google_cloud(
-                audio,
-                language=language,
-                credentials_json=open(self.creds).read()
-            )
-        except sr.UnknownValueError:
-            print("Google Cloud Speech could not understand audio")
+            with sr.AudioFile(audio_path) as source, ThreadPoolExecutor(self.workers) as executor:
+                for index, (start, audio) in enumerate(self._chunks(source)):
+                    pending.append(executor.submit(self._recognize_chunk, index, start, audio, language))
+                    # limit number of chunks kept in memory
+                    if len(pending) >= 2 * self.workers:
+                        collect()
+                while pending:
+                    collect()
+        except sr.RequestError:
+            logger.exception('Speech recognition of {} failed'.format(audio_file))
             return
-        except sr.RequestError as e:
+        text = ' '.join(text for text in texts if text)
+        if not text:
+            logger.warning('Speech could not be understood in {}'.format(audio_file))
             return
+        self.text = text
         return text
@@ -1,15 +1,358 @@
+import os
 import re
+import math
+import sys
+import mmap
+import struct
 import string
+import threading
+from array import array
 from collections import Counter
+import numpy as np
+import metrics
+from utils import LRUCache
+from spelling_index import SymmetricDeleteIndex, TrieIndex
+
+
+class WordFrequencies:
+    """
+    Compact frequency model of dictionary words.
+    Words are sorted by frequency (most frequent first, ties alphabetically),
+    counts and probabilities are stored in arrays in the same order.
+    """
+
+    def __init__(self, counter):
+        """
+        :param counter: Counter of words
+        """
+        self.words = sorted(counter, key=lambda w: (-counter[w], w))
+        self.ranks = {word: rank for rank, word in enumerate(self.words)}
+        self.counts = array('l', (counter[w] for w in self.words))
+        self.total = sum(self.counts)
+        self.probabilities = array('d', (c / self.total for c in self.counts))
+
+    def rank(self, word):
+        """
+        Position of word in frequency order, unknown words are the last
+        :param word: string word
+        :return: int rank
+        """
+        return self.ranks.get(word, len(self.words))
+
+    def probability(self, word):
+        """
+        Word probability
+        :param word: string word
+        :return: float probability, 0 for unknown words
+        """
+        rank = self.ranks.get(word)
+        if rank is None:
+            return 0.0
+        return self.probabilities[rank]
+
+    def __getitem__(self, word):
+        rank = self.ranks.get(word)
+        if rank is None:
+            return 0
+        return self.counts[rank]
+
+    def __contains__(self, word):
+        return word in self.ranks
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+class MappedWordFrequencies:
+    """
+    Frequency model of dictionary words memory-mapped from compiled
+    dictionary file (see compile_dictionary). Pages of file are shared
+    by all processes that map it.
+
+    File layout: header, offsets of words (uint32, count + 1),
+    counts (uint32), frequency ranks (uint32) and utf-8 words
+    sorted by their bytes.
+    """
+    MAGIC = b'SPELLDIC'
+    VERSION = 1
+    HEADER = struct.Struct('<8sHHIQ')
+
+    def __init__(self, filepath):
+        """
+        :param filepath: string path to compiled dictionary
+        """
+        with open(filepath, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, little_endian, count, total = self.HEADER.unpack_from(self._mmap)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('{} is not a compiled dictionary of version {}'.format(filepath, self.VERSION))
+        if bool(little_endian) != (sys.byteorder == 'little'):
+            raise ValueError('{} was compiled on platform with different byte order'.format(filepath))
+        self.count = count
+        self.total = total
+        view = memoryview(self._mmap)
+        start = self.HEADER.size
+        self.offsets = view[start:start + 4 * (count + 1)].cast('I')
+        start += 4 * (count + 1)
+        self.counts = view[start:start + 4 * count].cast('I')
+        start += 4 * count
+        self.ranks = view[start:start + 4 * count].cast('I')
+        start += 4 * count
+        self.blob = view[start:]
+
+    def _word(self, position):
+        return bytes(self.blob[self.offsets[position]:self.offsets[position + 1]])
+
+    def _find(self, word):
+        """
+        Binary search of word
+        :param word: string word
+        :return: int position of word or None
+        """
+        key = word.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._word(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._word(low) == key:
+            return low
+        return None
+
+    def rank(self, word):
+        """
+        Position of word in frequency order, unknown words are the last
+        :param word: string word
+        :return: int rank
+        """
+        position = self._find(word)
+        if position is None:
+            return self.count
+        return self.ranks[position]
+
+    def probability(self, word):
+        """
+        Word probability
+        :param word: string word
+        :return: float probability, 0 for unknown words
+        """
+        return self[word] / self.total
+
+    def __getitem__(self, word):
+        position = self._find(word)
+        if position is None:
+            return 0
+        return self.counts[position]
+
+    def __contains__(self, word):
+        return self._find(word) is not None
+
+    def __iter__(self):
+        # frequency order as WordFrequencies, words are stored in order of their bytes
+        positions = np.argsort(np.frombuffer(self.ranks, dtype=np.uint32), kind='stable')
+        return (self._word(i).decode('utf-8') for i in positions.tolist())
+
+    def __len__(self):
+        return self.count
+
+
+def compile_dictionary(corpus_path, dictionary_path):
+    """
+    Compile text corpus to dictionary file loaded by MappedWordFrequencies
+    :param corpus_path: string path to text
+    :param dictionary_path: string path to output file
+    """
+    frequencies = WordFrequencies(Counter(SpellChecker._find_words(open(corpus_path).read())))
+    words = sorted(frequencies.words, key=lambda w: w.encode('utf-8'))
+    encoded = [w.encode('utf-8') for w in words]
+    offsets = array('I', [0])
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+    counts = array('I', (frequencies[w] for w in words))
+    ranks = array('I', (frequencies.rank(w) for w in words))
+    header = MappedWordFrequencies.HEADER.pack(
+        MappedWordFrequencies.MAGIC, MappedWordFrequencies.VERSION,
+        sys.byteorder == 'little', len(words), frequencies.total
+    )
+    # write to temporary file, so running workers never map half-written dictionary
+    tmp_path = dictionary_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        offsets.tofile(f)
+        counts.tofile(f)
+        ranks.tofile(f)
+        f.write(b''.join(encoded))
+    os.replace(tmp_path, dictionary_path)
+
+
+class BigramModel:
+    """
+    Bigram language model of text used as dictionary.
+    Bigrams are stored as sorted array of pairs of word ids,
+    probability is interpolated with unigram probability.
+    """
+
+    def __init__(self, words, weight=0.7):
+        """
+        :param words: list of words of text
+        :param weight: float weight of bigram probability, the rest is unigram probability
+        """
+        self.weight = weight
+        self.ids = {}
+        ids = np.fromiter((self.ids.setdefault(w, len(self.ids)) for w in words), dtype=np.int64, count=len(words))
+        self.size = len(self.ids)
+        self.unigrams = np.bincount(ids, minlength=self.size)
+        self.total = len(ids)
+        self.bigrams, self.bigram_counts = np.unique(ids[:-1] * self.size + ids[1:], return_counts=True)
+
+    def _bigram_count(self, first, second):
+        key = first * self.size + second
+        position = np.searchsorted(self.bigrams, key)
+        if position < len(self.bigrams) and self.bigrams[position] == key:
+            return self.bigram_counts[position]
+        return 0
+
+    def probability(self, previous, word):
+        """
+        Probability of word following previous word
+        :param previous: string previous word or None at the start of text
+        :param word: string word
+        :return: float probability
+        """
+        word_id = self.ids.get(word)
+        # unknown words get probability of words seen once
+        unigram = (self.unigrams[word_id] if word_id is not None else 0.5) / self.total
+        previous_id = self.ids.get(previous)
+        if previous_id is None or word_id is None:
+            return (1 - self.weight) * unigram
+        bigram = self._bigram_count(previous_id, word_id) / self.unigrams[previous_id]
+        return self.weight * bigram + (1 - self.weight) * unigram
+
+    def score(self, word, contexts):
+        """
+        Log probability of word in all its contexts
+        :param word: string word
+        :param contexts: list of tuples of previous and next word
+        :return: float score
+        """
+        return sum(
+            math.log(self.probability(previous, word)) + math.log(self.probability(word, following))
+            if following is not None else math.log(self.probability(previous, word))
+            for previous, following in contexts
+        )
+
+
+# spell checkers of worker processes by their settings
+_worker_checkers = {}
+
+
+def _check_in_worker(settings, words, count):
+    """
+    Check words in worker process, spell checker is created once per process
+    :param settings: tuple of SpellChecker arguments
+    :param words: list of words
+    :param count: int number of returned corrected words
+    :return: list of corrections of words
+    """
+    checker = _worker_checkers.get(settings)
+    if checker is None:
+        filepath, use_index, dictionary_path, index_type, max_distance = settings
+        checker = _worker_checkers[settings] = SpellChecker(
+            filepath, use_index, dictionary_path=dictionary_path, index_type=index_type, max_distance=max_distance
+        )
+    return [checker.check(word, count) for word in words]
 
 
 class SpellChecker:
     """
     Check spelling and provides corrections.
     """
+    # min number of unknown words of document checked by executor
+    PARALLEL_MIN_WORDS = 200
+    # number of words checked by one task of executor
+    PARALLEL_BATCH_SIZE = 64
+    # indexes of candidates: symmetric delete index is the fastest, trie uses
+    # less memory and supports any max distance
+    INDEX_TYPES = {
+        'delete': SymmetricDeleteIndex,
+        'trie': TrieIndex,
+    }
+
+    def __init__(self, filepath='text_data/big.txt', use_index=True, cache_size=10000, cache_top=10,
+                 dictionary_path=None, index_type='delete', max_distance=2):
+        """
+        :param filepath: string path to text used as dictionary
+        :param use_index: bool find candidates using index of dictionary words
+        :param cache_size: int max number of words with cached corrections
+        :param cache_top: int number of cached corrections of word
+        :param dictionary_path: string path to dictionary compiled from filepath,
+         defaults to filepath with .dict extension. Text is read only when
+         compiled dictionary does not exist or is older than text
+        :param index_type: string index of candidates, delete or trie (see INDEX_TYPES)
+        :param max_distance: int max edit distance of candidates found by index
+        """
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError('Unknown index type: {}'.format(index_type))
+        if dictionary_path is None:
+            dictionary_path = os.path.splitext(filepath)[0] + '.dict'
+        self.filepath = filepath
+        self.dictionary_path = dictionary_path
+        if self._is_compiled(filepath, dictionary_path):
+            self.words = MappedWordFrequencies(dictionary_path)
+        else:
+            self.words = WordFrequencies(Counter(SpellChecker._find_words(open(filepath).read())))
+        self.use_index = use_index
+        self.index_type = index_type
+        self.max_distance = max_distance
+        self.cache = LRUCache(cache_size)
+        self.cache_top = cache_top
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._language_model = None
+
+    @property
+    def index(self):
+        """
+        Index of dictionary words, built on first use
+        :return: SymmetricDeleteIndex or TrieIndex
+        """
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self.INDEX_TYPES[self.index_type](self.words, max_distance=self.max_distance)
+        return self._index
 
-    def __init__(self, filepath='text_data/big.txt'):
-        self.words = Counter(SpellChecker._find_words(open(filepath).read()))
+    @property
+    def language_model(self):
+        """
+        Bigram model of text used as dictionary, built on first use
+        :return: BigramModel
+        """
+        if self._language_model is None:
+            with self._index_lock:
+                if self._language_model is None:
+                    with open(self.filepath) as f:
+                        self._language_model = BigramModel(self._find_words(f.read()))
+        return self._language_model
+
+    @staticmethod
+    def _is_compiled(filepath, dictionary_path):
+        """
+        Check that compiled dictionary is up to date
+        :param filepath: string path to text
+        :param dictionary_path: string path to compiled dictionary
+        :return: bool
+        """
+        if not os.path.exists(dictionary_path):
+            return False
+        if not os.path.exists(filepath):
+            return True
+        return os.path.getmtime(dictionary_path) >= os.path.getmtime(filepath)
 
     @staticmethod
     def _find_words(text):
@@ -51,9 +394,9 @@ class SpellChecker:
         :param word: string word
         :return: float probability
         """
-        n = sum(self.words.values())
-        return self.words[word] / n
+        return self.words.probability(word)
 
+    @metrics.timed('spell_candidates')
     def _candidates(self, word):
         """
         Generate possible spelling corrections for word.
@@ -61,6 +404,8 @@ class SpellChecker:
         :return: word from dictionary or word get by 1 correction
          or word get by 2 corrections or word itself
         """
+        if self.use_index:
+            return self.index.candidates(word) or [word]
         return (
             self._known([word]) or
             self._known(self._one_edit(word)) or
@@ -75,9 +420,46 @@ class SpellChecker:
         :param count: int number of returned corrected words
         :return: list of  words
         """
-        sorted_candidates = sorted(self._candidates(word), key=self._get_probability, reverse=True)
+        if count <= self.cache_top:
+            cached = self.cache.get(word)
+            if cached is not None:
+                return cached[:count]
+        # rank orders by probability, words with equal probability alphabetically
+        sorted_candidates = sorted(self._candidates(word), key=self.words.rank)
+        self.cache.put(word, sorted_candidates[:max(count, self.cache_top)])
         return sorted_candidates[:count]
 
+    @property
+    def version(self):
+        """
+        Version of dictionary, changes with dictionary words or frequencies
+        and with index settings which change candidates
+        :return: string
+        """
+        version = '{}-{}'.format(len(self.words), self.words.total)
+        if self.use_index and (self.index_type, self.max_distance) != ('delete', 2):
+            version += '-{}{}'.format(self.index_type, self.max_distance)
+        return version
+
+    def suggest(self, word, count=5, max_distance=None):
+        """
+        Closest dictionary words, needs trie index
+        :param word: string
+        :param count: int max number of returned words
+        :param max_distance: int max edit distance, max_distance of checker by default
+        :return: list of tuples of word and edit distance, sorted by distance and then by frequency
+        """
+        if not isinstance(self.index, TrieIndex):
+            raise ValueError('Suggestions need trie index')
+        return self.index.search(word, max_distance, count)
+
+    def cache_stats(self):
+        """
+        Statistics of cache of corrections
+        :return: dict
+        """
+        return self.cache.stats()
+
     def multiple_check(self, words_to_analyze, count=2):
         """
         Check multiple words
@@ -85,10 +467,111 @@ class SpellChecker:
         :param count: int number of returned corrected words
         :return: dict of words
         """
-        result = {}
-        for word in self.find_words(words_to_analyze):
-            result[word] = self.check(word, count)
-        return result
+        return self.correct_document(words_to_analyze, count)
+
+    def correct_document(self, text, count=2, executor=None, context=False):
+        """
+        Check all words of document at once. Every distinct word is checked once,
+        known words are found with one set intersection and only unknown
+        words not in cache are corrected, by executor for big documents.
+        :param text: string text
+        :param count: int number of returned corrected words
+        :param executor: concurrent.futures.Executor (e.g. ProcessPoolExecutor),
+         workers create their own spell checker with the same dictionary
+        :param context: bool rank corrections by bigram language model
+         in contexts of all occurrences of word
+        :return: dict of words in order of first occurrence
+        """
+        return self.correct_words(self._find_words(text), count, executor, context)
+
+    def correct_words(self, words, count=2, executor=None, context=False):
+        """
+        Check words already split from document, see correct_document
+        :param words: list of words
+        :param count: int number of returned corrected words
+        :param executor: concurrent.futures.Executor
+        :param context: bool rank corrections by bigram language model
+        :return: dict of words in order of first occurrence
+        """
+        unique = dict.fromkeys(words)
+        if self.use_index:
+            known = self.index.word_set.intersection(unique)
+        else:
+            known = self._known(unique)
+        width = max(count, self.cache_top) if context else count
+        corrections = {}
+        missing = []
+        for word in unique:
+            if word in known:
+                corrections[word] = [word]
+                continue
+            cached = self.cache.get(word) if width <= self.cache_top else None
+            if cached is not None:
+                corrections[word] = cached[:width]
+            else:
+                missing.append(word)
+        if executor is not None and len(missing) >= self.PARALLEL_MIN_WORDS:
+            settings = (self.filepath, self.use_index, self.dictionary_path, self.index_type, self.max_distance)
+            batches = [missing[i:i + self.PARALLEL_BATCH_SIZE] for i in range(0, len(missing), self.PARALLEL_BATCH_SIZE)]
+            futures = [executor.submit(_check_in_worker, settings, batch, max(width, self.cache_top)) for batch in batches]
+            for batch, future in zip(batches, futures):
+                for word, candidates in zip(batch, future.result()):
+                    self.cache.put(word, candidates)
+                    corrections[word] = candidates[:width]
+        else:
+            for word in missing:
+                corrections[word] = self.check(word, width)
+        if context:
+            self._rank_in_context(words, corrections, known)
+        return {word: corrections[word][:count] for word in unique}
+
+    def _rank_in_context(self, words, corrections, known):
+        """
+        Sort corrections of unknown words by probability in their contexts
+        :param words: list of words of document
+        :param corrections: dict word -> list of corrections, sorted in place
+        :param known: set of known words
+        """
+        contexts = {}
+        for i, word in enumerate(words):
+            if word not in known:
+                contexts.setdefault(word, []).append((
+                    words[i - 1] if i > 0 else None,
+                    words[i + 1] if i + 1 < len(words) else None
+                ))
+        model = self.language_model
+        for word, word_contexts in contexts.items():
+            corrections[word] = sorted(corrections[word], key=lambda c: -model.score(c, word_contexts))
+
+    @staticmethod
+    def _read_words(filepath, chunk_size=1 << 16):
+        """
+        Generator. Reads text file chunk by chunk and yields its words,
+        word cut at the end of chunk is joined with the rest of it
+        :param filepath: string path to text file
+        :param chunk_size: int number of characters read at once
+        """
+        rest = ''
+        with open(filepath) as f:
+            for chunk in iter(lambda: f.read(chunk_size), ''):
+                words = SpellChecker._find_words(rest + chunk)
+                rest = ''
+                if words and re.match(r'\w', chunk[-1]):
+                    rest = words.pop()
+                yield from words
+        if rest:
+            yield rest
+
+    def check_file(self, filepath, count=2, executor=None):
+        """
+        Check words of text file without reading whole file into memory,
+        only distinct words are kept
+        :param filepath: string path to text file
+        :param count: int number of returned corrected words
+        :param executor: concurrent.futures.Executor, see correct_document
+        :return: dict of words
+        """
+        return self.correct_words(list(dict.fromkeys(self._read_words(filepath))), count, executor)
 
     def _known(self, words):
         """
@@ -97,3 +580,9 @@ class SpellChecker:
         :return: set of known words
         """
         return set(w for w in words if w in self.words)
+
+
+if __name__ == '__main__':
+    # python spell_checker.py text_data/big.txt text_data/big.dict
+    corpus = sys.argv[1] if len(sys.argv) > 1 else 'text_data/big.txt'
+    compile_dictionary(corpus, sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(corpus)[0] + '.dict')
@@ -0,0 +1,293 @@
+import heapq
+import string
+
+
+def deletes(word, distance):
+    """
+    All strings that are at most `distance` deletes away from word
+    :param word: string word
+    :param distance: int max number of deletes
+    :return: set of strings, including word itself
+    """
+    result = {word}
+    layer = {word}
+    for _ in range(distance):
+        layer = {w[:i] + w[i + 1:] for w in layer for i in range(len(w))}
+        result |= layer
+    return result
+
+
+def damerau_levenshtein(source, target):
+    """
+    Unrestricted Damerau-Levenshtein distance (Lowrance-Wagner algorithm)
+    :param source: string
+    :param target: string
+    :return: int minimal number of deletes, inserts, replaces and
+     transposes of adjacent characters
+    """
+    max_distance = len(source) + len(target)
+    rows = [[max_distance] * (len(target) + 2)]
+    rows += [[max_distance] + list(range(len(target) + 1))]
+    rows += [[max_distance, i] + [0] * len(target) for i in range(1, len(source) + 1)]
+    last_row = {}
+    for i in range(1, len(source) + 1):
+        last_match_column = 0
+        for j in range(1, len(target) + 1):
+            i1 = last_row.get(target[j - 1], 0)
+            j1 = last_match_column
+            cost = 1
+            if source[i - 1] == target[j - 1]:
+                cost = 0
+                last_match_column = j
+            rows[i + 1][j + 1] = min(
+                rows[i][j] + cost,
+                rows[i + 1][j] + 1,
+                rows[i][j + 1] + 1,
+                rows[i1][j1] + (i - i1 - 1) + 1 + (j - j1 - 1),
+            )
+        last_row[source[i - 1]] = i
+    return rows[len(source) + 1][len(target) + 1]
+
+
+class SymmetricDeleteIndex:
+    """
+    Symmetric delete index for spelling candidates.
+    Maps every string that is at most `max_distance` deletes away from
+    a dictionary word to that word, so lookup needs only hash probes
+    for deletes of the checked word. Returns the same candidates as
+    enumerating all edits built from `letters` (see SpellChecker._one_edit).
+    """
+
+    def __init__(self, words, max_distance=2, letters=string.ascii_lowercase):
+        """
+        :param words: iterable of dictionary words
+        :param max_distance: int max edit distance of candidates
+        :param letters: string alphabet used for inserts and replaces
+        """
+        self.max_distance = max_distance
+        self.letters = frozenset(letters)
+        self.words = list(words)
+        self.word_set = set(self.words)
+        # delete -> word id, or list of ids when delete is shared by several words
+        self.deletes = {}
+        for word_id, word in enumerate(self.words):
+            for key in deletes(word, max_distance):
+                ids = self.deletes.get(key)
+                if ids is None:
+                    self.deletes[key] = word_id
+                elif isinstance(ids, list):
+                    ids.append(word_id)
+                else:
+                    self.deletes[key] = [ids, word_id]
+
+    def _one_edit_apart(self, source, target):
+        """
+        Check that target is one edit(delete, transpose, replace
+        or insert of a letter) away from source
+        :param source: string
+        :param target: string
+        :return: bool
+        """
+        if abs(len(source) - len(target)) > 1:
+            return False
+        prefix = 0
+        while prefix < min(len(source), len(target)) and source[prefix] == target[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < min(len(source), len(target)) - prefix and
+               source[-1 - suffix] == target[-1 - suffix]):
+            suffix += 1
+        if len(source) > len(target):
+            # any character can be deleted
+            return prefix + suffix >= len(target)
+        if len(source) < len(target):
+            # inserted character has to be a letter
+            return any(target[i] in self.letters for i in range(len(source) - suffix, prefix + 1))
+        if source == target:
+            # replace with the same letter or transpose of two equal characters
+            return (any(char in self.letters for char in source) or
+                    any(source[i] == source[i + 1] for i in range(len(source) - 1)))
+        if prefix + suffix == len(target) - 1:
+            return target[prefix] in self.letters
+        return (prefix + suffix == len(target) - 2 and
+                source[prefix] == target[prefix + 1] and source[prefix + 1] == target[prefix])
+
+    def _edits_apart(self, source, target, distance):
+        """
+        Check that target can be get from source with `distance` edits
+        :param source: string
+        :param target: string
+        :param distance: int number of edits
+        :return: bool
+        """
+        if distance == 1:
+            return self._one_edit_apart(source, target)
+        if all(char in self.letters for char in target):
+            # every inserted or replaced character of target is a letter,
+            # so alphabet does not restrict the edits
+            return damerau_levenshtein(source, target) <= distance
+        # rare case of digits or non-ascii characters, check every intermediate word
+        splits = [(source[:i], source[i:]) for i in range(len(source) + 1)]
+        intermediate = set(
+            [L + R[1:] for L, R in splits if R] +
+            [L + R[1] + R[0] + R[2:] for L, R in splits if len(R) > 1] +
+            [L + c + R[1:] for L, R in splits if R for c in self.letters] +
+            [L + c + R for L, R in splits for c in self.letters]
+        )
+        return any(self._edits_apart(word, target, distance - 1) for word in intermediate)
+
+    def lookup(self, word, distance):
+        """
+        Dictionary words that are at most `distance` edits away from word
+        :param word: string
+        :param distance: int number of edits
+        :return: set of words
+        """
+        found = set()
+        for key in deletes(word, distance):
+            ids = self.deletes.get(key)
+            if ids is None:
+                continue
+            if isinstance(ids, list):
+                found.update(ids)
+            else:
+                found.add(ids)
+        found = (self.words[word_id] for word_id in found)
+        return set(w for w in found if abs(len(w) - len(word)) <= distance and
+                   self._edits_apart(word, w, distance))
+
+    def candidates(self, word):
+        """
+        Known word, or known words with the smallest number of edits
+        :param word: string
+        :return: set of known words, empty if nothing was found
+        """
+        if word in self.word_set:
+            return {word}
+        for distance in range(1, self.max_distance + 1):
+            found = self.lookup(word, distance)
+            if found:
+                return found
+        return set()
+
+
+class TrieIndex:
+    """
+    Trie of dictionary words searched with rows of edit distance matrix
+    (Levenshtein automaton simulated by dynamic programming). Every node
+    computes the row of its character from the row of its parent, so words
+    with common prefix share the work, and a subtree is skipped as soon as
+    all values of the row exceed max distance. Works for any max distance
+    and any Unicode characters of dictionary words. Distance is optimal string
+    alignment distance (deletes, inserts, replaces and transposes of adjacent
+    characters, no substring is edited twice).
+    """
+
+    def __init__(self, words, max_distance=2):
+        """
+        :param words: iterable of dictionary words, most frequent first
+         (order breaks ties of candidates with equal distance and bounds search of count words),
+         e.g. WordFrequencies or MappedWordFrequencies
+        :param max_distance: int default max edit distance of candidates
+        """
+        self.max_distance = max_distance
+        self.words = list(words)
+        self.word_set = set(self.words)
+        # char -> child node, empty string -> word id of node which ends a word
+        self.root = {}
+        for word_id, word in enumerate(self.words):
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault('', word_id)
+
+    def search(self, word, max_distance=None, count=None):
+        """
+        Dictionary words close to word
+        :param word: string
+        :param max_distance: int max edit distance, index max_distance by default
+        :param count: int max number of returned words, all by default
+        :return: list of tuples of word and distance, sorted by distance
+         and then by order of dictionary words
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        # columns where transposition of two characters matches word, by the characters
+        transpositions = {}
+        for j in range(2, len(word) + 1):
+            transpositions.setdefault((word[j - 1], word[j - 2]), set()).add(j)
+        length = len(word)
+        bound = max_distance
+        # value of cells which can not be within max distance
+        limit = max_distance + 1
+        # heap of found words, the worst (the farthest, then the least frequent) on top
+        found = []
+        first_row = list(range(length + 1))
+        stack = [(child, char, '', 1, first_row, None) for char, child in self.root.items() if char]
+        while stack:
+            node, char, previous_char, depth, previous_row, before_previous_row = stack.pop()
+            transposed = transpositions.get((previous_char, char))
+            # cell (depth, j) costs at least |depth - j|, so only band of columns
+            # around diagonal can be within bound, other cells are left at limit
+            start = depth - bound if depth > bound else 1
+            end = depth + bound if depth + bound < length else length
+            row = [limit] * (length + 1)
+            row[0] = depth
+            value = row[start - 1]
+            for j in range(start, end + 1):
+                # insert
+                value += 1
+                above = previous_row[j]
+                if above < value:
+                    # delete
+                    value = above + 1
+                diagonal = previous_row[j - 1]
+                if word[j - 1] == char:
+                    if diagonal < value:
+                        value = diagonal
+                elif diagonal + 1 < value:
+                    # replace
+                    value = diagonal + 1
+                if transposed and j in transposed and before_previous_row[j - 2] + 1 < value:
+                    value = before_previous_row[j - 2] + 1
+                row[j] = value
+            word_id = node.get('')
+            if word_id is not None and row[length] <= bound:
+                heapq.heappush(found, (-row[length], -word_id))
+                if count is not None and len(found) > count:
+                    heapq.heappop(found)
+                if count is not None and len(found) == count:
+                    # only words as close as the worst of found words can be better
+                    bound = -found[0][0]
+            # transposition can not be cheaper than the row of its second character,
+            # so subtree of row above bound has no words within bound
+            if min(row) <= bound:
+                stack.extend(
+                    (child, next_char, char, depth + 1, row, previous_row)
+                    for next_char, child in node.items() if next_char
+                )
+        return [(self.words[-word_id], -distance) for distance, word_id in sorted(found, reverse=True)]
+
+    def lookup(self, word, distance):
+        """
+        Dictionary words that are at most `distance` edits away from word
+        :param word: string
+        :param distance: int number of edits
+        :return: set of words
+        """
+        return set(w for w, _ in self.search(word, distance))
+
+    def candidates(self, word):
+        """
+        Known word, or known words with the smallest number of edits
+        :param word: string
+        :return: set of known words, empty if nothing was found
+        """
+        if word in self.word_set:
+            return {word}
+        # search of smaller distance visits much smaller part of trie
+        for distance in range(1, self.max_distance + 1):
+            found = self.lookup(word, distance)
+            if found:
+                return found
+        return set()
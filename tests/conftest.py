@@ -0,0 +1,36 @@
+import os
+import sys
+
+# modules of the service are in the root of repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import pytest
+from resources import resources
+
+POSITIVE_WORDS = ['good', 'great', 'fun', 'brilliant', 'moving', 'superb']
+NEGATIVE_WORDS = ['bad', 'awful', 'boring', 'dull', 'weak', 'mess']
+NEUTRAL_WORDS = ['movie', 'film', 'plot', 'actor', 'scene', 'story', 'the', 'a', 'and', 'of']
+
+
+@pytest.fixture
+def fake_stopwords(monkeypatch):
+    # NLTK data is not needed by tests
+    monkeypatch.setitem(resources._resources, 'stopwords', frozenset(['the', 'a', 'and', 'of']))
+
+
+@pytest.fixture
+def reviews():
+    """
+    Synthetic labeled reviews, lists of words of pos and neg documents
+    """
+    rand = random.Random(3)
+    documents = []
+    for i in range(120):
+        label = 'pos' if i % 2 else 'neg'
+        own, other = (POSITIVE_WORDS, NEGATIVE_WORDS) if label == 'pos' else (NEGATIVE_WORDS, POSITIVE_WORDS)
+        words = rand.choices(NEUTRAL_WORDS, k=rand.randint(5, 15)) + rand.choices(own, k=rand.randint(1, 4)) + \
+            rand.choices(other, k=rand.randint(0, 2))
+        rand.shuffle(words)
+        documents.append((words, label))
+    return documents
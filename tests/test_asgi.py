@@ -0,0 +1,171 @@
+import time
+import asyncio
+import threading
+import pytest
+from flask import Flask, Response, stream_with_context
+from asgi import App
+
+LIMITS = {
+    'slow': {'concurrency': 2, 'queue': 1, 'timeout': 0},
+    'stream': {'concurrency': 2, 'queue': 2, 'timeout': 0.5},
+    'default': {'concurrency': 4, 'queue': 4, 'timeout': 0},
+}
+
+
+class Handlers:
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.closed = threading.Event()
+
+
+@pytest.fixture
+def handlers():
+    handlers = Handlers()
+    yield handlers
+    handlers.release.set()
+
+
+@pytest.fixture
+def app(handlers):
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/slow')
+    def slow():
+        with handlers.lock:
+            handlers.active += 1
+            handlers.max_active = max(handlers.max_active, handlers.active)
+        handlers.release.wait(5)
+        with handlers.lock:
+            handlers.active -= 1
+        return 'slow'
+
+    @flask_app.route('/fast')
+    def fast():
+        return 'fast'
+
+    @flask_app.route('/stream')
+    def stream():
+        def generate():
+            for i in range(3):
+                yield '{}\n'.format(i)
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    @flask_app.route('/stalled')
+    def stalled():
+        def generate():
+            try:
+                yield 'first\n'
+                handlers.release.wait(5)
+                yield 'second\n'
+            finally:
+                handlers.closed.set()
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    @flask_app.route('/never')
+    def never():
+        handlers.release.wait(5)
+        return 'late'
+
+    groups = {'slow': 'slow', 'stream': 'stream', 'stalled': 'stream', 'never': 'stream'}
+    return App(flask_app, LIMITS, groups)
+
+
+async def call(app, path):
+    """
+    Send GET request to ASGI app
+    :return: tuple of status, list of body chunks and bool response was completed
+    """
+    messages = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            await asyncio.sleep(60)
+        requested = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': []}
+    await app(scope, receive, send)
+    bodies = [m for m in messages if m['type'] == 'http.response.body']
+    completed = bool(bodies) and not bodies[-1].get('more_body', False)
+    return messages[0]['status'], [m['body'] for m in bodies if m['body']], completed
+
+
+async def wait_until(condition, timeout=5):
+    start = time.monotonic()
+    while not condition():
+        assert time.monotonic() - start < timeout
+        await asyncio.sleep(0.01)
+
+
+def test_group_concurrency_is_limited(app, handlers):
+    async def scenario():
+        slow = [asyncio.ensure_future(call(app, '/slow')) for _ in range(3)]
+        await wait_until(lambda: handlers.active == 2)
+        # other groups are not blocked by full group
+        assert await call(app, '/fast') == (200, [b'fast'], True)
+        assert app.groups['slow'].stats()['waiting'] == 1
+        handlers.release.set()
+        return await asyncio.gather(*slow)
+
+    results = asyncio.run(scenario())
+    assert [status for status, _, _ in results] == [200, 200, 200]
+    assert handlers.max_active == 2
+    assert app.groups['slow'].stats()['handled'] == 3
+
+
+def test_full_queue_is_rejected(app, handlers):
+    async def scenario():
+        slow = [asyncio.ensure_future(call(app, '/slow')) for _ in range(3)]
+        await wait_until(lambda: app.groups['slow'].waiting == 1)
+        rejected = await call(app, '/slow')
+        handlers.release.set()
+        return rejected, await asyncio.gather(*slow)
+
+    (status, body, _), results = asyncio.run(scenario())
+    assert status == 503
+    assert b'Too many requests' in body[0]
+    assert [status for status, _, _ in results] == [200, 200, 200]
+
+
+def test_timeout_of_handler(app, handlers):
+    async def scenario():
+        result = await call(app, '/never')
+        handlers.release.set()
+        # thread holds slot until handler finishes
+        await wait_until(lambda: app.groups['stream'].running == 0)
+        return result
+
+    status, body, completed = asyncio.run(scenario())
+    assert status == 504
+    assert completed
+
+
+def test_chunks_are_streamed(app):
+    status, body, completed = asyncio.run(call(app, '/stream'))
+    assert status == 200
+    assert body == [b'0\n', b'1\n', b'2\n']
+    assert completed
+
+
+def test_timeout_of_streamed_chunk_closes_response(app, handlers):
+    async def scenario():
+        result = await call(app, '/stalled')
+        assert not handlers.closed.is_set()
+        handlers.release.set()
+        await wait_until(lambda: app.groups['stream'].running == 0)
+        return result
+
+    status, body, completed = asyncio.run(scenario())
+    assert status == 200
+    assert body == [b'first\n']
+    # response is cut, so server closes connection instead of ending body
+    assert not completed
+    assert handlers.closed.wait(5)
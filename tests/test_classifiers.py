@@ -0,0 +1,55 @@
+import os
+import pickle
+import numpy as np
+import pytest
+from nltk.classify import NaiveBayesClassifier
+from classifiers import BayesClassifier, SparseNaiveBayes, save_best_words
+
+
+def test_missing_best_words_are_not_selected_at_serve_time(tmp_path, fake_stopwords, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    classifier = BayesClassifier(model='best_words', cfr=SparseNaiveBayes)
+    with pytest.raises(ValueError, match='Best words of model are missing'):
+        classifier.feature_words(['good', 'movie'])
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_best_words_saved_by_training_are_loaded(tmp_path, fake_stopwords):
+    path = str(tmp_path / 'best_words.json')
+    save_best_words(['good', 'the', 'bad'], path, corpus='test')
+    classifier = BayesClassifier(model='best_words', cfr=SparseNaiveBayes, best_words_path=path)
+    assert classifier.feature_words(['good', 'the', 'movie', 'bad']) == ['good', 'bad']
+
+
+def test_pickled_model_without_best_words_fails_to_load(tmp_path, fake_stopwords):
+    classifier = BayesClassifier(model='best_words', best_words_path=str(tmp_path / 'best_words.json'))
+    data = pickle.dumps(classifier)
+    with pytest.raises(ValueError):
+        pickle.loads(data)
+    classifier.set_best_words(['good'])
+    assert pickle.loads(pickle.dumps(classifier)).best_words_set == {'good'}
+
+
+def test_sparse_naive_bayes_matches_nltk(reviews):
+    featuresets = [({word: True for word in words}, label) for words, label in reviews]
+    train, test = featuresets[:90], featuresets[90:]
+    reference = NaiveBayesClassifier.train(train)
+    classifier = SparseNaiveBayes.train(train)
+    labels = list(classifier.labels())
+    assert sorted(labels) == sorted(reference.labels())
+    # features not seen in training are ignored by both
+    documents = [features for features, _ in test] + [{'unseen': True}, {}]
+    probabilities = classifier.prob_classify_many(documents)
+    for document, row in zip(documents, probabilities):
+        distribution = reference.prob_classify(document)
+        np.testing.assert_allclose(row, [distribution.prob(label) for label in labels], rtol=0, atol=1e-12)
+    # labels of equal probability are ordered differently, documents of training corpus have no ties
+    assert classifier.classify_many(documents[:-2]) == reference.classify_many(documents[:-2])
+    # probabilities of BayesClassifier tables are base 2 logs as in NLTK
+    _, features, feature_log_probs, label_log_probs = classifier.tables()
+    for label in labels:
+        assert label_log_probs[labels.index(label)] == pytest.approx(reference._label_probdist.logprob(label))
+        for feature in ('good', 'bad', 'movie'):
+            assert feature_log_probs[labels.index(label), features[feature]] == pytest.approx(
+                reference._feature_probdist[label, feature].logprob(True)
+            )
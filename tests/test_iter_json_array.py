@@ -0,0 +1,30 @@
+import io
+import json
+import pytest
+from utils import iter_json_array
+
+ITEMS = [1, 2.5e3, -7, 1e-7, True, None, 'ü\n"x', {'id': 3, 'data': 'é ok'}, [1, [2]], []]
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 8))
+@pytest.mark.parametrize('indent', [None, 1])
+def test_items_split_between_chunks(chunk_size, indent):
+    body = json.dumps(ITEMS, ensure_ascii=False, indent=indent).encode()
+    assert list(iter_json_array(io.BytesIO(body), chunk_size)) == ITEMS
+
+
+def test_other_values_are_parsed_whole():
+    assert list(iter_json_array(io.BytesIO(b' {"data": "x"} '), 2)) == [{'data': 'x'}]
+    assert list(iter_json_array(io.BytesIO(b'[]'), 1)) == []
+    with pytest.raises(ValueError):
+        iter_json_array(io.BytesIO(b'{"data"'))
+
+
+@pytest.mark.parametrize('body, items', [
+    (b'["a" "b"]', ['a', None]),
+    (b'[1, }', [1, None]),
+    (b'["a", "b', ['a', None]),
+    (b'["a", "\xff"]', ['a', None]),
+])
+def test_invalid_rest_of_array_is_one_item(body, items):
+    assert list(iter_json_array(io.BytesIO(body), 3)) == items
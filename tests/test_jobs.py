@@ -0,0 +1,31 @@
+import threading
+import pytest
+from jobs import JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=1, max_pending=1)
+    release = threading.Event()
+    queue.register('echo', lambda payload: release.wait(5) and payload)
+    yield queue
+    release.set()
+
+
+def test_failed_insert_releases_place_in_queue(queue):
+    # payload that is not JSON serializable fails before job is stored
+    for _ in range(2):
+        with pytest.raises(TypeError):
+            queue.submit('echo', {'data': object()})
+    job_id = queue.submit('echo', 'text')
+    assert queue.get(job_id)['status'] in (JobQueue.QUEUED, JobQueue.RUNNING)
+    with pytest.raises(QueueFull):
+        queue.submit('echo', 'text')
+
+
+def test_invalid_wait_of_job_status(tmp_path):
+    import api
+    api.app.config['JOBS_DB'] = str(tmp_path / 'api_jobs.sqlite3')
+    client = api.app.test_client()
+    assert client.get('/jobs/missing?wait=soon').status_code == 400
+    assert client.get('/jobs/missing?wait=0.1').status_code == 404
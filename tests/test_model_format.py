@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pytest
+from nltk.classify import NaiveBayesClassifier
+from sklearn import svm
+from sklearn.feature_extraction.text import TfidfVectorizer
+import model_format
+from model_format import CompactBayesClassifier, CompactSVMClassifier, LinearScorer
+from classifiers import BayesClassifier, SVMClassifier, SparseNaiveBayes
+
+TEXTS = ['Good movie, great fun!', 'awful awful plot', 'boring', 'movie', '', 'The actor: brilliant and dull']
+
+
+def train_svm(reviews, **params):
+    classifier = SVMClassifier()
+    classifier.vectorizer = TfidfVectorizer(**params)
+    vectors = classifier.vectorizer.fit_transform([' '.join(words) for words, _ in reviews])
+    classifier.classifier = svm.LinearSVC().fit(vectors, [label for _, label in reviews])
+    return classifier
+
+
+def train_bayes(reviews, model, cfr):
+    classifier = BayesClassifier(model=model, cfr=cfr)
+    if model == 'best_words':
+        classifier.set_best_words(['good', 'great', 'bad', 'awful', 'movie'])
+    features = classifier.featurize()
+    classifier.train_data = [(features(words), label) for words, label in reviews]
+    classifier.train()
+    return classifier
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'sublinear_tf': True, 'min_df': 2},
+    {'binary': True, 'norm': 'l1'},
+    {'use_idf': False, 'norm': None, 'lowercase': False},
+])
+def test_svm_round_trip(tmp_path, reviews, params):
+    classifier = train_svm(reviews, **params)
+    path = str(tmp_path / 'svm.model')
+    model_format.export(classifier, path)
+    loaded = model_format.load(path)
+    assert isinstance(loaded, CompactSVMClassifier)
+    expected = classifier.batch_predict_prob(TEXTS)
+    np.testing.assert_allclose(LinearScorer.from_classifier(classifier).predict_prob(TEXTS), expected, atol=1e-12)
+    np.testing.assert_allclose(loaded.batch_predict_prob(TEXTS), expected, atol=1e-12)
+    assert loaded.predict(TEXTS) == pytest.approx(classifier.predict(TEXTS), abs=1e-12)
+
+
+def test_svm_with_bigrams_is_not_exported(tmp_path, reviews):
+    with pytest.raises(ValueError):
+        model_format.export(train_svm(reviews, ngram_range=(1, 2)), str(tmp_path / 'svm.model'))
+
+
+@pytest.mark.parametrize('model', ['bag_of_words', 'best_words'])
+@pytest.mark.parametrize('cfr', [SparseNaiveBayes, NaiveBayesClassifier])
+def test_naive_bayes_round_trip(tmp_path, fake_stopwords, reviews, model, cfr):
+    classifier = train_bayes(reviews, model, cfr)
+    path = str(tmp_path / 'naive.model')
+    model_format.export(classifier, path)
+    loaded = model_format.load(path)
+    assert isinstance(loaded, CompactBayesClassifier)
+    assert loaded.model == model
+    documents = [words for words, _ in reviews[:20]] + [['unseen'], []]
+    np.testing.assert_allclose(
+        loaded.batch_predict_prob(documents, tokenized=True),
+        classifier.batch_predict_prob(documents, tokenized=True),
+        atol=1e-12
+    )
+
+
+@pytest.fixture
+def model_path(tmp_path, reviews):
+    path = str(tmp_path / 'svm.model')
+    model_format.export(train_svm(reviews), path)
+    return path
+
+
+def _change_byte(path, offset):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        value = f.read(1)
+        f.seek(offset)
+        f.write(bytes([value[0] ^ 0xff]))
+
+
+def test_corrupt_data_is_detected(model_path):
+    # last byte of arrays
+    _change_byte(model_path, os.path.getsize(model_path) - 1)
+    with pytest.raises(ValueError, match='Checksum'):
+        model_format.load(model_path)
+    # arrays are still mapped when checksum is not verified
+    assert isinstance(model_format.load(model_path, verify=False), CompactSVMClassifier)
+
+
+def test_bad_header_is_detected(model_path):
+    _change_byte(model_path, 0)
+    with pytest.raises(ValueError, match='not a model file'):
+        model_format.load(model_path)
+
+
+def test_truncated_file_is_detected(model_path):
+    with open(model_path, 'r+b') as f:
+        f.truncate(model_format.HEADER.size + 10)
+    with pytest.raises(ValueError, match='truncated'):
+        model_format.load(model_path)
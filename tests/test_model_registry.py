@@ -0,0 +1,84 @@
+import os
+import mmap
+import pickle
+import tracemalloc
+import logging
+import numpy as np
+from sklearn import svm
+from sklearn.feature_extraction.text import TfidfVectorizer
+import model_format
+from classifiers import BayesClassifier, SVMClassifier
+from model_registry import ModelEntry, ModelRegistry, object_size
+
+TEXTS = ['good', 'great fun', 'awful', 'boring plot', 'movie', 'unknown', '']
+
+
+def test_object_size_counts_owned_arrays_once():
+    array = np.zeros(100000)
+    size = object_size({'a': array, 'b': [array, array[10:]]})
+    assert array.nbytes < size < array.nbytes + 4096
+
+
+def test_object_size_does_not_count_mapped_arrays():
+    buffer = mmap.mmap(-1, 800000)
+    array = np.frombuffer(memoryview(buffer), dtype=np.float64)
+    assert object_size([array]) < 4096
+
+
+def test_load_keeps_tracing_of_user(tmp_path):
+    path = str(tmp_path / 'model.pickle')
+    with open(path, 'wb') as f:
+        pickle.dump({'weights': np.ones(1000)}, f)
+    entry = ModelEntry('model', path)
+    tracemalloc.start()
+    try:
+        ModelRegistry._load(entry, path, 'digest', os.stat(path))
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    assert entry.memory > 8000
+
+
+def _classifiers(reviews):
+    svm_classifier = SVMClassifier()
+    svm_classifier.vectorizer = TfidfVectorizer()
+    vectors = svm_classifier.vectorizer.fit_transform([' '.join(words) for words, _ in reviews])
+    svm_classifier.classifier = svm.LinearSVC().fit(vectors, [label for _, label in reviews])
+    bayes_classifier = BayesClassifier(model='bag_of_words')
+    features = bayes_classifier.featurize()
+    bayes_classifier.train_data = [(features(words), label) for words, label in reviews]
+    bayes_classifier.train()
+    return {'svm': svm_classifier, 'naive_bag_of_words': bayes_classifier}
+
+
+def test_model_files_and_pickles_give_same_predictions(tmp_path, fake_stopwords, reviews, caplog):
+    models = {}
+    for name, classifier in _classifiers(reviews).items():
+        with open(str(tmp_path / (name + '.pickle')), 'wb') as f:
+            pickle.dump(classifier, f)
+        model_format.export(classifier, str(tmp_path / (name + '.model')))
+        models[name] = (str(tmp_path / (name + '.model')), str(tmp_path / (name + '.pickle')))
+        # model file was not exported
+        models[name + '_pickle'] = (str(tmp_path / (name + '_pickle.model')), str(tmp_path / (name + '.pickle')))
+    registry = ModelRegistry(models)
+    with caplog.at_level(logging.INFO, logger='model_registry'):
+        registry.preload()
+    stats = registry.stats()
+    for name in ('svm', 'naive_bag_of_words'):
+        assert stats[name]['scoring'] == 'compiled'
+        assert stats[name + '_pickle']['scoring'] == 'pickle'
+    np.testing.assert_allclose(
+        registry.get('svm').batch_predict_prob(TEXTS),
+        registry.get('svm_pickle').batch_predict_prob(TEXTS),
+        atol=1e-12
+    )
+    # NLTK tokenizer data is not needed for tokenized documents
+    documents = [text.split() for text in TEXTS]
+    np.testing.assert_allclose(
+        registry.get('naive_bag_of_words').batch_predict_prob(documents, tokenized=True),
+        registry.get('naive_bag_of_words_pickle').batch_predict_prob(documents, tokenized=True),
+        atol=1e-12
+    )
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 2
+    assert all('slow pickle path' in message for message in warnings)
@@ -0,0 +1,50 @@
+import time
+import threading
+import metrics
+from metrics import SamplingProfiler
+
+
+class PausedCounter(metrics.StackCounter):
+    """
+    Counter which lets sampler run in the middle of iteration over its values
+    """
+    iterating = threading.Event()
+
+    def values(self):
+        for i, value in enumerate(super().values()):
+            if i == 0:
+                self.iterating.set()
+                time.sleep(0.2)
+            yield value
+
+
+def test_sampler_runs_concurrently_with_end(monkeypatch):
+    monkeypatch.setattr(metrics, 'StackCounter', PausedCounter)
+    PausedCounter.iterating.clear()
+    profiler = SamplingProfiler(threshold=0, interval=0.001)
+    sampled = threading.Event()
+    collapsing = threading.Event()
+
+    def collapse(frame):
+        if sampled.is_set():
+            # new stack is added while end iterates over stacks
+            collapsing.set()
+            PausedCounter.iterating.wait(5)
+            return 'new;stack'
+        sampled.set()
+        return 'first;stack'
+
+    profiler._collapse = collapse
+    profiler.start()
+    token = profiler.begin('request')
+    stacks = token[2]
+    assert sampled.wait(5)
+    while not stacks:
+        time.sleep(0.001)
+    # sampler has taken active requests and collapses stack of this one
+    assert collapsing.wait(5)
+    profiler.end(token, 1.0)
+    profiler.stop()
+    profile = profiler.stats()['profiles'][0]
+    assert profile['samples'] >= 1
+    assert all(stack.startswith('first;stack ') for stack in profile['stacks'])
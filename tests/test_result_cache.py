@@ -0,0 +1,35 @@
+import os
+import json
+import threading
+from result_cache import ResultCache
+
+
+def test_concurrent_put_of_same_key(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    key = cache.key('spell_check', '1', 'digest')
+    errors = []
+    barrier = threading.Barrier(8)
+
+    def put(i):
+        barrier.wait()
+        try:
+            for j in range(50):
+                cache.put(key, {'writer': i, 'words': ['word'] * (i * 100 + j)})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put, args=(i, )) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    path = cache._path(key)
+    with open(path) as f:
+        result = json.load(f)
+    assert len(result['words']) >= result['writer'] * 100
+    # temporary files are renamed or removed
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+    cache.memory.clear()
+    assert cache.get(key)[1] == 'DISK'
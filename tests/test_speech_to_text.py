@@ -0,0 +1,119 @@
+import time
+import wave
+import struct
+import logging
+import pytest
+import numpy as np
+import speech_recognition as sr
+from speech_to_text import SpeechToText, rms
+
+
+@pytest.mark.parametrize('sample_width, fragment', [
+    (1, struct.pack('<4b', 3, -4, 3, -4)),
+    (2, struct.pack('<4h', 3, -4, 3, -4)),
+    (3, b'\x03\x00\x00\xfc\xff\xff' * 2),
+    (4, struct.pack('<4i', 3, -4, 3, -4)),
+])
+def test_rms_of_signed_samples(sample_width, fragment):
+    # sqrt((9 + 16) / 2) truncated as by audioop
+    assert rms(fragment, sample_width) == 3
+
+
+def test_rms_of_empty_and_incomplete_fragment():
+    assert rms(b'', 2) == 0
+    assert rms(struct.pack('<h', -1000) + b'\x01', 2) == 1000
+    assert rms(struct.pack('<i', -2 ** 31), 4) == 2 ** 31
+
+
+SAMPLE_RATE = 8000
+
+
+def write_wav(path, segments):
+    """
+    Write 16-bit mono audio
+    :param segments: list of (seconds, amplitude), samples alternate sign, so RMS is amplitude
+    """
+    samples = []
+    for seconds, amplitude in segments:
+        samples.extend(amplitude * (1 - 2 * (i % 2)) for i in range(int(seconds * SAMPLE_RATE)))
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(struct.pack('<{}h'.format(len(samples)), *samples))
+    return path
+
+
+class FakeBackend:
+    """
+    Recognizes peak amplitude of chunk as word, earlier chunks are recognized slower
+    """
+
+    def __init__(self, words):
+        self.words = words
+        self.calls = 0
+
+    def recognize(self, audio, language):
+        self.calls += 1
+        word = int(np.abs(np.frombuffer(audio.frame_data, dtype='<i2')).max()) // 1000
+        if not word:
+            raise sr.UnknownValueError()
+        time.sleep(0.01 * (self.words - word))
+        return 'word{}'.format(word)
+
+
+def speech(words, pause=0.1):
+    # word k is 0.3 seconds of amplitude k * 1000 and more, followed by silence
+    return [part for k in range(1, words + 1) for part in ((0.3, 1000 * k + 100), (pause, 0))]
+
+
+def chunks(path, stt):
+    with sr.AudioFile(path) as source:
+        cut = [(start, len(audio.frame_data) / 2 / SAMPLE_RATE) for start, audio in stt._chunks(source)]
+    # starts and durations
+    return [start for start, _ in cut], [duration for _, duration in cut]
+
+
+def test_chunks_are_cut_at_silence(tmp_path):
+    path = write_wav(str(tmp_path / 'speech.wav'), speech(3))
+    stt = SpeechToText(backend=FakeBackend(3), chunk_duration=0.25, max_chunk_duration=1, window=0.025)
+    # every word is cut after its first silent window, the rest of silence starts the next chunk
+    starts, durations = chunks(path, stt)
+    assert starts == pytest.approx([0, 0.325, 0.725, 1.125])
+    assert durations == pytest.approx([0.325, 0.4, 0.4, 0.075])
+
+
+def test_chunks_without_silence_are_cut_at_max_duration(tmp_path):
+    path = write_wav(str(tmp_path / 'speech.wav'), [(2.5, 2000)])
+    stt = SpeechToText(backend=FakeBackend(3), chunk_duration=0.25, max_chunk_duration=1, window=0.025)
+    starts, durations = chunks(path, stt)
+    assert starts == pytest.approx([0, 1, 2])
+    assert durations == pytest.approx([1, 1, 0.5])
+
+
+def test_texts_are_stitched_in_order_with_bounded_pending_chunks(tmp_path):
+    words = 12
+    path = write_wav(str(tmp_path / 'speech.wav'), speech(words))
+    stt = SpeechToText(backend=FakeBackend(words), workers=2, chunk_duration=0.25, window=0.025)
+    cut = stt._chunks
+    pending = []
+
+    def counted_chunks(source):
+        for index, chunk in enumerate(cut(source)):
+            # chunks read but not collected yet
+            pending.append(index - len(stt.timings))
+            yield chunk
+
+    stt._chunks = counted_chunks
+    assert stt.recognize(path) == ' '.join('word{}'.format(k) for k in range(1, words + 1))
+    # trailing silence is the last chunk
+    assert [timing['chunk'] for timing in stt.timings] == list(range(words + 1))
+    assert max(pending) < 2 * stt.workers
+
+
+def test_silence_is_not_understood(tmp_path, caplog):
+    path = write_wav(str(tmp_path / 'silence.wav'), [(1, 0)])
+    stt = SpeechToText(backend=FakeBackend(1), chunk_duration=0.25)
+    with caplog.at_level(logging.WARNING, logger='speech_to_text'):
+        assert stt.recognize(path) is None
+    assert 'could not be understood' in caplog.text
@@ -0,0 +1,34 @@
+import pytest
+from spell_checker import SpellChecker, MappedWordFrequencies, compile_dictionary
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / 'corpus.txt'
+    path.write_text(' '.join(['the'] * 50 + ['hat'] * 10 + ['bat'] * 5 + ['cat'] + ['naïve'] * 3 + ['route66'] * 2))
+    return str(path)
+
+
+@pytest.fixture(params=['text', 'compiled'])
+def trie_checker(request, corpus):
+    if request.param == 'compiled':
+        compile_dictionary(corpus, corpus[:-len('.txt')] + '.dict')
+    checker = SpellChecker(corpus, index_type='trie', max_distance=2)
+    assert isinstance(checker.words, MappedWordFrequencies) == (request.param == 'compiled')
+    return checker
+
+
+def test_words_are_iterated_by_frequency(trie_checker):
+    assert list(trie_checker.words) == ['the', 'hat', 'bat', 'naïve', 'route66', 'cat']
+
+
+def test_suggestions_are_ordered_by_distance_then_frequency(trie_checker):
+    assert trie_checker.suggest('xat', 3) == [('hat', 1), ('bat', 1), ('cat', 1)]
+    # search bounded by count keeps the most frequent candidate
+    assert trie_checker.suggest('xat', 1) == [('hat', 1)]
+    assert trie_checker.check('xat', 3) == ['hat', 'bat', 'cat']
+
+
+def test_unicode_and_digits(trie_checker):
+    assert trie_checker.suggest('naive', 1) == [('naïve', 1)]
+    assert trie_checker.check('route6') == ['route66']
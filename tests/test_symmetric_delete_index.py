@@ -0,0 +1,88 @@
+import random
+import string
+import pytest
+from spell_checker import SpellChecker
+from spelling_index import SymmetricDeleteIndex
+
+WORDS = (
+    'the of and to in that was his with had for you not but say are they this from have which one '
+    'were all she when there said would been their more will who some into could time them other '
+    'spelling correct letter word house horse world water little people about after before'
+).split()
+# digits and non-ascii characters can not be inserted or replaced by edits
+RARE_WORDS = ['naïve', 'café', 'route66', 'mp3', 'b2b', 'über', '1984']
+# characters of typos, edits of the old checker use only ascii letters
+TYPO_CHARS = string.ascii_lowercase + '0123456789éï'
+
+
+def _reference_candidates(words, word):
+    """
+    Candidates found by enumerating all edits as SpellChecker without index
+    """
+    known = lambda edits: set(e for e in edits if e in words)
+    return (
+        known([word]) or
+        known(SpellChecker._one_edit(word)) or
+        known(SpellChecker._two_edits(word)) or
+        set()
+    )
+
+
+def _typo(rng, word):
+    """
+    Word changed by one random delete, transpose, replace or insert
+    """
+    i = rng.randrange(len(word) + 1)
+    kind = rng.choice(['delete', 'transpose', 'replace', 'insert'])
+    if kind == 'delete' and i < len(word):
+        return word[:i] + word[i + 1:]
+    if kind == 'transpose' and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == 'replace' and i < len(word):
+        return word[:i] + rng.choice(TYPO_CHARS) + word[i + 1:]
+    return word[:i] + rng.choice(TYPO_CHARS) + word[i:]
+
+
+def _typos(count, seed=13):
+    rng = random.Random(seed)
+    typos = set(RARE_WORDS)
+    while len(typos) < count:
+        word = rng.choice(WORDS + RARE_WORDS)
+        for _ in range(rng.randint(1, 3)):
+            word = _typo(rng, word) or rng.choice(TYPO_CHARS)
+        typos.add(word)
+    return sorted(typos)
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    rng = random.Random(7)
+    path = tmp_path_factory.mktemp('corpus') / 'corpus.txt'
+    path.write_text(' '.join(word for word in WORDS + RARE_WORDS for _ in range(rng.randint(1, 20))))
+    return str(path)
+
+
+def test_candidates_are_same_as_enumerated_edits(corpus):
+    checker = SpellChecker(corpus, use_index=False)
+    words = set(checker.words)
+    index = SymmetricDeleteIndex(checker.words)
+    for typo in _typos(150):
+        assert index.candidates(typo) == _reference_candidates(words, typo), typo
+
+
+def test_rare_characters_use_edits_fallback(corpus):
+    index = SymmetricDeleteIndex(SpellChecker(corpus, use_index=False).words)
+    # digits and non-ascii characters are kept or deleted, but never inserted or replaced
+    assert index.candidates('naïv') == {'naïve'}
+    assert index.candidates('naive') == {'have'}
+    assert index.candidates('rout66') == {'route66'}
+    assert index.candidates('rute6') == set()
+    assert index.candidates('984') == set()
+    assert index.candidates('xüber') == {'über'}
+
+
+def test_check_is_same_with_and_without_index(corpus):
+    indexed = SpellChecker(corpus, use_index=True)
+    enumerated = SpellChecker(corpus, use_index=False)
+    for typo in _typos(150, seed=29):
+        assert indexed.check(typo, 3) == enumerated.check(typo, 3), typo
@@ -0,0 +1,135 @@
+import re
+import random
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from resources import resources
+from text_analysis import TextAnalysis, TextStatistics
+
+VOCABULARY = (
+    'the movie film plot was good bad long short actor played scene story ended well badly '
+    'Anna Bob said it I liked hated every minute of and but'
+).split()
+ENDINGS = ['.', '!', '?', '!!?', '...', '."']
+TAGS = ['JJ', 'NN', 'VB', 'DT', 'IN']
+
+
+class SentenceTokenizer:
+    """
+    Splits text after sentence punctuation followed by white space, as punkt without abbreviations
+    """
+    pattern = re.compile(r'(?<=[.!?"])\s+')
+
+    def tokenize(self, text):
+        return [sent for sent in self.pattern.split(text.strip()) if sent]
+
+
+class Tagger:
+    """
+    Tags word by its characters, the same word has always the same tag
+    """
+
+    def tag(self, words):
+        return [(word, TAGS[sum(map(ord, word)) % len(TAGS)]) for word in words]
+
+
+@pytest.fixture
+def fake_nltk(monkeypatch):
+    monkeypatch.setitem(resources._resources, 'sentence_tokenizer', SentenceTokenizer())
+    monkeypatch.setitem(resources._resources, 'pos_tagger', Tagger())
+    monkeypatch.setattr(resources, 'wordpunct_tokenize', lambda text: re.findall(r'\w+|[^\w\s]+', text))
+
+
+def _text(sentences, seed=5):
+    rand = random.Random(seed)
+    parts = []
+    for _ in range(sentences):
+        words = rand.choices(VOCABULARY, k=rand.randint(1, 12))
+        words[0] = words[0].capitalize()
+        parts.append(' '.join(words) + rand.choice(ENDINGS) + rand.choice([' ', '  ', '\n', '\n\n']))
+    return ''.join(parts)
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / 'text.txt'
+    path.write_text(_text(300))
+    return str(path)
+
+
+def test_streaming_and_sharded_analysis_are_same_as_single_pass(fake_nltk, text_file):
+    expected = TextAnalysis(filepath=text_file).analyze()
+    assert expected['sentences count'] == 300
+    assert expected['adjectives'] and expected['nouns'] and expected['verbs']
+    # chunks end inside words, sentences and runs of punctuation
+    for chunk_size in (1, 7, 64, 1000, 10 ** 6):
+        assert TextAnalysis(filepath=text_file, streaming=True, chunk_size=chunk_size).analyze() == expected
+    with ThreadPoolExecutor(4) as executor:
+        for shard_size in (1, 50, 1000, 10 ** 6):
+            assert TextAnalysis(filepath=text_file).analyze(executor, shard_size) == expected
+            streaming = TextAnalysis(filepath=text_file, streaming=True, chunk_size=64)
+            assert streaming.analyze(executor, shard_size) == expected
+            assert streaming.sent_count == 300
+
+
+def _statistics(sentences, top):
+    statistics = TextStatistics(top)
+    for tagged_words in sentences:
+        statistics.update(tagged_words)
+    return statistics
+
+
+@pytest.mark.parametrize('top', [1, 3, 10])
+def test_merged_statistics_are_same_as_statistics_of_whole_text(top):
+    rand = random.Random(11)
+    tagger = Tagger()
+    sentences = [tagger.tag(rand.choices(VOCABULARY, k=rand.randint(0, 6))) for _ in range(30)]
+    expected = _statistics(sentences, top).result()
+    for splits in ([0], [30], [1], [2, 3, 4], [5, 17], list(range(31))):
+        bounds = [0] + splits + [len(sentences)]
+        parts = [_statistics(sentences[start:end], top) for start, end in zip(bounds, bounds[1:])]
+        merged = TextStatistics(top)
+        for part in parts:
+            assert merged.merge(part) is merged
+        assert merged.result() == expected, splits
+
+
+class ContextTagger:
+    """
+    Tags the first word of every tagged sequence as noun and other words as verbs
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def tag(self, words):
+        self.calls.append(list(words))
+        return [(word, 'NN' if i == 0 else 'VB') for i, word in enumerate(words)]
+
+
+def test_sentences_are_tagged_separately(fake_nltk, monkeypatch, tmp_path):
+    tagger = ContextTagger()
+    monkeypatch.setitem(resources._resources, 'pos_tagger', tagger)
+    path = tmp_path / 'text.txt'
+    path.write_text('Anna liked the movie. Bob hated it! It ended. ' * 3)
+    expected = {
+        'words': ['anna', 'liked', 'the', 'bob', 'hated', 'it', 'it', 'ended', 'anna', 'liked'],
+        'words count': 8,
+        'sentences count': 9,
+        'most_common_10': [
+            ('it', 6), ('anna', 3), ('liked', 3), ('the', 3), ('movie', 3), ('bob', 3), ('hated', 3), ('ended', 3),
+        ],
+        'adjectives': [],
+        # whole text tagged at once had only one noun
+        'nouns': ['anna', 'bob', 'it'],
+        'verbs': ['liked', 'the', 'movie', 'hated', 'it', 'ended'],
+    }
+    sentences = [['anna', 'liked', 'the', 'movie'], ['bob', 'hated', 'it'], ['it', 'ended']] * 3
+    with ThreadPoolExecutor(2) as executor:
+        for analysis, args in (
+            (TextAnalysis(filepath=str(path)), ()),
+            (TextAnalysis(filepath=str(path), streaming=True, chunk_size=5), ()),
+            (TextAnalysis(filepath=str(path)), (executor, 30)),
+        ):
+            tagger.calls.clear()
+            assert analysis.analyze(*args) == expected
+            assert sorted(tagger.calls) == sorted(sentences)
@@ -1,8 +1,112 @@
-import string
-from nltk import pos_tag
-from nltk import sent_tokenize
-from nltk import wordpunct_tokenize
-from nltk.probability import FreqDist
+from collections import deque, Counter
+from resources import resources
+from utils import clean_tokens
+
+
+# version of analysis result, change it when result of the same text changes
+VERSION = '1'
+# size of chunks read from file in streaming mode
+CHUNK_SIZE = 64 * 1024
+# number of characters of sentences analyzed together by one worker
+SHARD_SIZE = 64 * 1024
+# max number of shards submitted to executor and not merged yet
+MAX_PENDING_SHARDS = 32
+# buffered text longer than that is split to sentences without waiting for the next chunk
+MAX_SENTENCE_SIZE = 1024 * 1024
+
+
+class TextStatistics:
+    """
+    Statistics of text updated sentence by sentence.
+    Keeps only what is needed for result, so memory depends on vocabulary, not on text size.
+    """
+    TAGS = {
+        'JJ': 'adjectives',
+        'NN': 'nouns',
+        'VB': 'verbs',
+    }
+
+    def __init__(self, top=10):
+        self.top = top
+        self.sent_count = 0
+        self.frequencies = Counter()
+        # first words of text
+        self.words = []
+        # first distinct words of every part of speech
+        self.tagged = {name: [] for name in self.TAGS.values()}
+
+    def update(self, tagged_words):
+        """
+        Add tagged words of one sentence
+        :param tagged_words: list of (word, tag) tuples
+        """
+        self.sent_count += 1
+        self.frequencies.update(word for word, _ in tagged_words)
+        for word, tag in tagged_words[:11 - len(self.words)]:
+            self.words.append(word)
+        for word, tag in tagged_words:
+            name = self.TAGS.get(tag)
+            if name:
+                words = self.tagged[name]
+                if len(words) < self.top and word not in words:
+                    words.append(word)
+
+    def merge(self, other):
+        """
+        Add statistics of text that follows this one.
+        Result of merging statistics of consecutive parts is the same
+        as statistics of whole text.
+        :param other: TextStatistics
+        :return: self
+        """
+        self.sent_count += other.sent_count
+        self.frequencies.update(other.frequencies)
+        self.words.extend(other.words[:11 - len(self.words)])
+        for name, words in self.tagged.items():
+            for word in other.tagged[name]:
+                if len(words) >= self.top:
+                    break
+                if word not in words:
+                    words.append(word)
+        return self
+
+    def result(self):
+        """
+        Analysis result
+        :return: dict
+        """
+        return {
+            'words': self.words[:3] + self.words[4:11],
+            'words count': len(self.frequencies),
+            'sentences count': self.sent_count,
+            'most_common_10': self.frequencies.most_common(10),
+            'adjectives': self.tagged['adjectives'],
+            'nouns': self.tagged['nouns'],
+            'verbs': self.tagged['verbs'],
+        }
+
+
+def analyze_tokens(sentence_tokens):
+    """
+    Tag tokenized sentences.
+    Every sentence is tagged separately, so tags of words at sentence boundaries
+    can differ from tagging of all words of text as one sequence, as before streaming.
+    :param sentence_tokens: iterable of lists of tokens of sentence
+    :return: TextStatistics
+    """
+    statistics = TextStatistics()
+    for words in sentence_tokens:
+        statistics.update(resources.pos_tag(words) if words else [])
+    return statistics
+
+
+def analyze_sentences(sentences):
+    """
+    Tokenize and tag sentences
+    :param sentences: iterable of string sentences
+    :return: TextStatistics
+    """
+    return analyze_tokens(TextAnalysis.tokenize_sentence(sent) for sent in sentences)
 
 
 class TextAnalysis:
@@ -10,57 +114,136 @@ class TextAnalysis:
     Provides simple text analysis
     """
 
-    def __init__(self, filepath=None, text=None):
+    def __init__(self, filepath=None, text=None, streaming=False, chunk_size=CHUNK_SIZE, document=None):
+        """
+        :param filepath: string path to text file
+        :param text: string text
+        :param streaming: bool read file by chunks during analysis
+         instead of reading it whole into memory
+        :param chunk_size: int number of characters read at once in streaming mode
+        :param document: TokenizedDocument, analyzed using its sentences and tokens
+        """
         self.filepath = filepath
+        self.document = document
+        if document is not None:
+            text = document.text
         self.text = text
-        if not text:
+        self.streaming = streaming and not text
+        self.chunk_size = chunk_size
+        if not text and not self.streaming:
             self.text = open(filepath).read()
         self.sent_count = 0
 
+    def _read_sentences(self):
+        """
+        Generator. Reads file by chunks and yields its sentences.
+        The last sentences of chunk are kept until the next chunk is read,
+        because they can continue there.
+        """
+        buffer = ''
+        with open(self.filepath) as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), ''):
+                buffer += chunk
+                sentences = resources.sent_tokenize(buffer)
+                if len(buffer) > MAX_SENTENCE_SIZE:
+                    yield from sentences
+                    buffer = ''
+                    continue
+                # boundaries at the end of buffer can change when next chunk is read
+                # (e.g. "!!?" at the end is split to separate sentences),
+                # so keep the last two sentences with words and everything after them
+                keep = len(sentences)
+                with_words = 0
+                while keep > 0 and with_words < 2:
+                    keep -= 1
+                    if any(char.isalnum() for char in sentences[keep]):
+                        with_words += 1
+                position = 0
+                for sent in sentences[:keep]:
+                    position = buffer.find(sent, position) + len(sent)
+                    yield sent
+                buffer = buffer[position:].lstrip()
+        yield from resources.sent_tokenize(buffer)
+
+    def sentences(self):
+        """
+        Generator. Yields sentences of text
+        """
+        if self.streaming:
+            return self._read_sentences()
+        if self.document is not None:
+            return iter(self.document.sentences)
+        return iter(resources.sent_tokenize(self.text))
+
+    @staticmethod
+    def tokenize_sentence(sent):
+        """
+        Split sentence to tokens(words)
+        :param sent: string sentence
+        :return: list of tokens
+        """
+        return list(clean_tokens(resources.wordpunct_tokenize(sent)))
+
     def tokenize(self, text):
         """
         Generator. Yields tokens from text
         :param text: string
         """
         # break the document into sentences
-        for sent in sent_tokenize(self.text):
+        for sent in self.sentences():
             self.sent_count += 1
             # break the sentence into part of speech tagged tokens(words)
-            for token in wordpunct_tokenize(sent):
-                token = token.lower()
-                token = token.strip()
-                token = token.strip('_')
-                # skip punctuation
-                if all(char in set(string.punctuation) for char in token):
-                    continue
-                yield token
+            yield from self.tokenize_sentence(sent)
+
+    def shards(self, shard_size=SHARD_SIZE):
+        """
+        Generator. Yields lists of consecutive sentences
+        :param shard_size: int min number of characters in list
+        """
+        shard, size = [], 0
+        for sent in self.sentences():
+            shard.append(sent)
+            size += len(sent)
+            if size >= shard_size:
+                yield shard
+                shard, size = [], 0
+        if shard:
+            yield shard
+
+    def _analyze_parallel(self, executor, shard_size):
+        """
+        Analyze shards of sentences in executor and merge results in text order
+        :param executor: concurrent.futures.Executor
+        :param shard_size: int number of characters in shard
+        :return: TextStatistics
+        """
+        statistics = TextStatistics()
+        pending = deque()
+        for shard in self.shards(shard_size):
+            pending.append(executor.submit(analyze_sentences, shard))
+            # limit number of submitted shards, so file is not read ahead whole
+            if len(pending) >= MAX_PENDING_SHARDS:
+                statistics.merge(pending.popleft().result())
+        while pending:
+            statistics.merge(pending.popleft().result())
+        return statistics
 
-    def analyze(self):
+    def analyze(self, executor=None, shard_size=SHARD_SIZE):
         """
-        Provides simple text analysis
+        Provides simple text analysis.
+        Sentences are tagged one by one, so memory is bounded by the
+        longest sentence also for big files in streaming mode.
+        :param executor: concurrent.futures.Executor (e.g. ProcessPoolExecutor)
+         used to analyze shards of text in parallel, result is the same as without it.
+         Not used for already tokenized document
+        :param shard_size: int number of characters of text analyzed by one task
         :return: dict with analysis result
         """
-        result = {}
-        adjectives, nouns, verbs = ([], [], [])
-        words = [word for word in self.tokenize(self.text)]
-        frequencies = FreqDist(words)
-        tagged_words = pos_tag(words)
-        for word in tagged_words:
-            tag = word[1]
-            if tag == 'JJ':
-                adjectives.append(word[0])
-            elif tag == 'NN':
-                nouns.append(word[0])
-            elif tag == 'VB':
-                verbs.append(word[0])
-        result['words'] = words[:3] + words[4:11]
-        result['words count'] = len(frequencies)
-        result['sentences count'] = self.sent_count
-        result['most_common_10'] = frequencies.most_common(10)
-        result['adjectives'] = list(set(adjectives))[:10]
-        result['nouns'] = list(set(nouns))[:10]
-        result['verbs'] = list(set(verbs))[:10]
-        return result
-
-# a = TextAnalysis(filepath='text_data/text.txt')
-# print(a.analyze())
+        if self.document is not None:
+            statistics = analyze_tokens(self.document.sentence_tokens('wordpunct'))
+        elif executor is None:
+            statistics = analyze_sentences(self.sentences())
+        else:
+            statistics = self._analyze_parallel(executor, shard_size)
+        self.sent_count = statistics.sent_count
+        return statistics.result()
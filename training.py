@@ -0,0 +1,373 @@
+import os
+import sys
+import json
+import random
+import pickle
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import classification_report
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from classifiers import SVMClassifier, BayesClassifier, SparseNaiveBayes, select_best_words, save_best_words
+from resources import resources
+import model_format
+
+
+# changes when tokenization or cached data format changes
+VERSION = '1'
+
+
+def dump_atomic(obj, path):
+    """
+    Pickle object to temporary file and move it to path,
+    so readers (e.g. model registry) never load half-written file
+    :param obj: object
+    :param path: string path
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, -1)
+    os.replace(tmp_path, path)
+
+
+class Document:
+    """
+    Labelled review of corpus
+    """
+
+    def __init__(self, path, fileid, label, digest):
+        self.path = path
+        self.fileid = fileid
+        self.label = label
+        self.digest = digest
+
+
+class IncrementalSVMClassifier:
+    """
+    Linear SVM trained online with hashed features.
+    Can be updated with new labelled reviews without retraining from scratch.
+    Predicts pos/neg label for words as SVMClassifier.
+    """
+
+    def __init__(self, n_features=1 << 20, alpha=3e-5):
+        """
+        :param n_features: int number of hashed features
+        :param alpha: float regularization of SGD
+        """
+        # presence of words works better than raw counts without idf weights
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, binary=True, norm='l2')
+        self.classifier = SGDClassifier(loss='hinge', alpha=alpha, random_state=0)
+        self.classes = ['pos', 'neg']
+        self.test_vectors = None
+        self.test_labels = []
+        self.documents = 0
+        # hashes of reviews model was trained or validated on
+        self.seen = set()
+
+    def partial_fit(self, data, labels, epochs=10):
+        """
+        Update model with labelled reviews
+        :param data: list of string texts
+        :param labels: list of labels
+        :param epochs: int number of passes over data
+        """
+        vectors = self.vectorizer.transform(data)
+        labels = np.asarray(labels)
+        order = np.arange(len(labels))
+        random_state = np.random.RandomState(self.documents)
+        for _ in range(epochs):
+            random_state.shuffle(order)
+            self.classifier.partial_fit(vectors[order], labels[order], classes=self.classes)
+        self.documents += len(labels)
+
+    def validate(self):
+        """
+        Validate classifier
+        :return: classification report
+        """
+        return classification_report(self.test_labels, self.classifier.predict(self.test_vectors))
+
+    def predict(self, data):
+        """
+        Predict label
+        :param data: string text
+        :return: list of predicted labels
+        """
+        # probability predict 'pos' class
+        return self.batch_predict_prob(data).tolist()
+
+    def batch_predict_prob(self, documents, batch_size=10000):
+        """
+        Probabilities of 'pos' label for many documents at once
+        :param documents: list of string texts
+        :param batch_size: int number of documents vectorized together
+        :return: numpy array of probabilities
+        """
+        return SVMClassifier.batch_predict_prob(self, documents, batch_size)
+
+
+class TrainingPipeline:
+    """
+    Training of sentiment models with cached feature extraction.
+    Corpus files are read in parallel and identified by hash of content:
+    tokens of every file are cached on disk by its hash, TF-IDF matrices
+    by hash of the whole corpus, so retraining on unchanged corpus does not
+    read or vectorize reviews again and new reviews are tokenized once.
+    """
+
+    def __init__(self, data_dir='text_data/txt_sentoken', cache_dir='.training_cache', workers=8,
+                 output_dir='.'):
+        """
+        :param data_dir: string path to corpus with directory of reviews per label
+        :param cache_dir: string path to directory of cached features
+        :param workers: int number of files read at the same time
+        :param output_dir: string path to directory of trained models
+        """
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.output_dir = output_dir
+        self.classes = ['pos', 'neg']
+        self._documents = None
+        self._tokens = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _load_cache(self, name, default=None):
+        try:
+            with open(self._cache_path(name), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+
+    @staticmethod
+    def _digest(path):
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def documents(self):
+        """
+        Reviews of corpus sorted by file id. Hashes of files are cached
+        by size and modification time, so unchanged files are not read
+        :return: list of Document
+        """
+        if self._documents is None:
+            manifest_path = self._cache_path('manifest.json')
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+            files = []
+            for label in self.classes:
+                for filename in sorted(os.listdir(os.path.join(self.data_dir, label))):
+                    path = os.path.join(self.data_dir, label, filename)
+                    stat = os.stat(path)
+                    files.append((path, '{}/{}'.format(label, filename), label, [stat.st_mtime_ns, stat.st_size]))
+
+            def document(file):
+                path, fileid, label, stat = file
+                cached = manifest.get(fileid)
+                if cached and cached[:2] == stat:
+                    digest = cached[2]
+                else:
+                    digest = self._digest(path)
+                return Document(path, fileid, label, digest), stat + [digest]
+
+            with ThreadPoolExecutor(self.workers) as executor:
+                results = list(executor.map(document, files))
+            self._documents = [doc for doc, _ in results]
+            with open(manifest_path, 'w') as f:
+                json.dump({doc.fileid: entry for doc, entry in results}, f)
+        return self._documents
+
+    def corpus_digest(self):
+        """
+        Hash of the whole corpus
+        :return: string hex digest
+        """
+        sha256 = hashlib.sha256(VERSION.encode())
+        for doc in self.documents():
+            sha256.update('{}\0{}\0'.format(doc.fileid, doc.digest).encode())
+        return sha256.hexdigest()
+
+    def _read(self, doc):
+        with open(doc.path) as f:
+            return f.read()
+
+    def texts(self, documents):
+        """
+        Read reviews in parallel
+        :param documents: list of Document
+        :return: list of string texts
+        """
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(self._read, documents))
+
+    def tokens(self):
+        """
+        Tokens of every review tokenized as nltk movie_reviews corpus.
+        Only files not seen before are read
+        :return: dict hash of file -> list of tokens
+        """
+        if self._tokens is None:
+            cache_name = 'tokens-{}.pickle'.format(VERSION)
+            cached = self._load_cache(cache_name, {})
+            documents = self.documents()
+            missing = [doc for doc in documents if doc.digest not in cached]
+            for doc, text in zip(missing, self.texts(missing)):
+                cached[doc.digest] = resources.wordpunct_tokenize(text)
+            self._tokens = {doc.digest: cached[doc.digest] for doc in documents}
+            if missing or len(cached) != len(self._tokens):
+                # drop tokens of removed files
+                dump_atomic(self._tokens, self._cache_path(cache_name))
+        return self._tokens
+
+    def tfidf(self, **params):
+        """
+        TF-IDF vectorizer and vectors of train and test reviews,
+        cached by hash of corpus and vectorizer parameters
+        :param params: parameters of TfidfVectorizer
+        :return: tuple of vectorizer, train vectors, train labels, test vectors, test labels
+        """
+        params = dict({'min_df': 5, 'max_df': 0.8, 'sublinear_tf': True, 'use_idf': True}, **params)
+        key = hashlib.sha256('{}\0{}'.format(self.corpus_digest(), sorted(params.items())).encode()).hexdigest()
+        cache_name = 'tfidf-{}.pickle'.format(key[:16])
+        cached = self._load_cache(cache_name)
+        if cached is None:
+            documents = self.documents()
+            texts = self.texts(documents)
+            # split data to test and training sets as SVMClassifier.prepare_data
+            train = [i for i, doc in enumerate(documents) if not os.path.basename(doc.path).startswith('cv9')]
+            test = [i for i, doc in enumerate(documents) if os.path.basename(doc.path).startswith('cv9')]
+            vectorizer = TfidfVectorizer(**params)
+            train_vectors = vectorizer.fit_transform([texts[i] for i in train])
+            test_vectors = vectorizer.transform([texts[i] for i in test])
+            cached = (
+                vectorizer, train_vectors, [documents[i].label for i in train],
+                test_vectors, [documents[i].label for i in test]
+            )
+            dump_atomic(cached, self._cache_path(cache_name))
+        return cached
+
+    def train_svm(self):
+        """
+        Train SVM classifier on cached TF-IDF vectors
+        :return: SVMClassifier
+        """
+        classifier = SVMClassifier(data_dir=self.data_dir)
+        classifier.vectorizer, train_vectors, train_labels, classifier.test_vectors, classifier.test_labels = self.tfidf()
+        classifier.classifier.fit(train_vectors, train_labels)
+        return classifier
+
+    def best_words(self, count=10000):
+        """
+        Select best words on corpus and save them with models
+        :param count: int number of best words
+        :return: list of words
+        """
+        tokens = self.tokens()
+        words = select_best_words({
+            label: (token for doc in self.documents() if doc.label == label for token in tokens[doc.digest])
+            for label in self.classes
+        }, count)
+        save_best_words(
+            words, os.path.join(self.output_dir, 'best_words.json'), corpus=self.data_dir, digest=self.corpus_digest()
+        )
+        return words
+
+    def train_bayes(self, model='bag_of_words', seed=None, cfr=SparseNaiveBayes):
+        """
+        Train Naive Bayes classifier on cached tokens
+        :param model: string feature model of BayesClassifier
+        :param seed: int seed of shuffling of data
+        :param cfr: classifier class, SparseNaiveBayes or nltk NaiveBayesClassifier
+        :return: BayesClassifier
+        """
+        classifier = BayesClassifier(
+            model=model, cfr=cfr, best_words_path=os.path.join(self.output_dir, 'best_words.json')
+        )
+        if model == 'best_words':
+            classifier.set_best_words(self.best_words())
+        tokens = self.tokens()
+        features = classifier.featurize()
+        rand = random.Random(seed)
+        train_data, test_data = [], []
+        for label in self.classes:
+            data = [(features(tokens[doc.digest]), label) for doc in self.documents() if doc.label == label]
+            # split data as BayesClassifier.prepare_simple_data
+            cut_index = int(len(data) * 3 / 4)
+            train_data.extend(data[:cut_index])
+            test_data.extend(data[cut_index:])
+        rand.shuffle(train_data)
+        rand.shuffle(test_data)
+        classifier.train_data = train_data
+        classifier.test_data = test_data
+        classifier.train()
+        return classifier
+
+    def train_incremental(self, model=None):
+        """
+        Train online SVM on reviews it has not seen yet
+        :param model: IncrementalSVMClassifier to update, new model by default
+        :return: IncrementalSVMClassifier
+        """
+        if model is None:
+            model = IncrementalSVMClassifier()
+        documents = [doc for doc in self.documents() if doc.digest not in model.seen]
+        test = [doc for doc in documents if os.path.basename(doc.path).startswith('cv9')]
+        train = [doc for doc in documents if not os.path.basename(doc.path).startswith('cv9')]
+        if train:
+            model.partial_fit(self.texts(train), [doc.label for doc in train])
+        if test:
+            model.test_vectors = model.vectorizer.transform(self.texts(test))
+            model.test_labels = [doc.label for doc in test]
+        model.seen.update(doc.digest for doc in documents)
+        return model
+
+    def save(self, name, classifier):
+        """
+        Save classifier as model file, classifiers which can not be
+        exported (online SVM) are pickled. The other file of model is
+        removed, so model registry does not load stale model
+        :param name: string model name
+        :param classifier: classifier
+        """
+        model_path = os.path.join(self.output_dir, name + model_format.EXTENSION)
+        pickle_path = os.path.join(self.output_dir, name + '.pickle')
+        if isinstance(classifier, IncrementalSVMClassifier):
+            dump_atomic(classifier, pickle_path)
+            stale_path = model_path
+        else:
+            model_format.export(classifier, model_path)
+            stale_path = pickle_path
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    def train_and_save(self, incremental=False):
+        """
+        Train and serialize classifiers
+        :param incremental: bool update online SVM saved as svm.pickle instead of retraining SVM
+        """
+        if incremental:
+            try:
+                with open(os.path.join(self.output_dir, 'svm.pickle'), 'rb') as f:
+                    svm = pickle.load(f)
+            except OSError:
+                svm = None
+            if not isinstance(svm, IncrementalSVMClassifier):
+                svm = None
+            svm = self.train_incremental(svm)
+        else:
+            svm = self.train_svm()
+        self.save('naive_bag_of_words', self.train_bayes('bag_of_words'))
+        self.save('naive_best_words', self.train_bayes('best_words'))
+        self.save('svm', svm)
+
+
+if __name__ == '__main__':
+    # python training.py [--incremental]
+    TrainingPipeline().train_and_save(incremental='--incremental' in sys.argv[1:])
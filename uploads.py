@@ -0,0 +1,131 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class UploadTooLarge(Exception):
+    """
+    Raised when uploaded file is bigger than the limit
+    """
+
+
+class UploadStore:
+    """
+    Uploaded files stored by SHA256 hash of content, so the same content
+    uploaded many times is stored once. Uploads are streamed to disk chunk
+    by chunk and registered in SQLite with size and metadata, files can be
+    found by upload name or by hash.
+    """
+
+    def __init__(self, directory, max_size=100 << 20, chunk_size=1 << 16):
+        """
+        :param directory: string path to directory of files and registry
+        :param max_size: int max size of uploaded file in bytes
+        :param chunk_size: int number of bytes read from upload at once
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(directory, 'uploads.sqlite3'), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS files (digest TEXT PRIMARY KEY, size INTEGER, created REAL)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS uploads ('
+            'name TEXT PRIMARY KEY, digest TEXT, content_type TEXT, uploaded REAL)'
+        )
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def save(self, stream, name, content_type=None):
+        """
+        Stream upload to disk and register it
+        :param stream: file-like object with read(size) method
+        :param name: string safe name of upload
+        :param content_type: string content type of upload
+        :return: dict metadata of upload with path of file
+        :raises UploadTooLarge: when upload is bigger than max_size
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.directory, '{}.{}.{}.tmp'.format(name, os.getpid(), threading.get_ident()))
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise UploadTooLarge('File is bigger than {} bytes'.format(self.max_size))
+                    sha256.update(chunk)
+                    f.write(chunk)
+            digest = sha256.hexdigest()
+            path = self._path(digest)
+            duplicate = os.path.exists(path)
+            if not duplicate:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        now = time.time()
+        self._execute('INSERT OR IGNORE INTO files (digest, size, created) VALUES (?, ?, ?)', (digest, size, now))
+        self._execute(
+            'INSERT OR REPLACE INTO uploads (name, digest, content_type, uploaded) VALUES (?, ?, ?, ?)',
+            (name, digest, content_type, now)
+        )
+        return {
+            'name': name,
+            'digest': digest,
+            'size': size,
+            'content_type': content_type,
+            'uploaded': now,
+            'path': path,
+            'duplicate': duplicate,
+        }
+
+    def get(self, name):
+        """
+        Metadata of upload
+        :param name: string name of upload or hash of file
+        :return: dict with path of file or None if upload does not exist
+        """
+        rows = self._execute(
+            'SELECT uploads.name, files.digest, files.size, uploads.content_type, uploads.uploaded '
+            'FROM uploads JOIN files ON uploads.digest = files.digest WHERE uploads.name = ?', (name, )
+        )
+        if not rows:
+            rows = self._execute(
+                'SELECT NULL, digest, size, NULL, created FROM files WHERE digest = ?', (name, )
+            )
+        if not rows:
+            return None
+        name, digest, size, content_type, uploaded = rows[0]
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        return {
+            'name': name,
+            'digest': digest,
+            'size': size,
+            'content_type': content_type,
+            'uploaded': uploaded,
+            'path': path,
+        }
+
+    def stats(self):
+        """
+        Number of uploads and stored files
+        :return: dict
+        """
+        uploads = self._execute('SELECT COUNT(*) FROM uploads')[0][0]
+        files, size = self._execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files')[0]
+        return {'uploads': uploads, 'files': files, 'size': size, 'max_size': self.max_size}
@@ -1,13 +1,22 @@
+import json
 import time
+import codecs
 import string
 import logging
+import threading
 from functools import wraps
-from nltk import sent_tokenize
-from nltk import word_tokenize
+from collections import OrderedDict
+from json.decoder import WHITESPACE
+from resources import resources
+from metrics import request_duration, profiler
 
 
 logger = logging.getLogger(__name__)
 
+PUNCTUATION = frozenset(string.punctuation)
+# characters that can follow item of JSON array
+ITEM_ENDS = (' ', '\t', '\n', '\r', ',', ']')
+
 
 def __get_start_data(start_time, func):
     human_date = '{time.tm_hour}:{time.tm_min}:{time.tm_sec}'.format(time=time.localtime(start_time))
@@ -15,8 +24,19 @@ def __get_start_data(start_time, func):
     return text
 
 
+def _status(response):
+    """
+    HTTP status of value returned by route
+    """
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return getattr(response, 'status_code', 200)
+
+
 def logger_exception(func):
-    """Wrapper to log all exceprions. Method DOES NOT catch exceptions
+    """Wrapper to log all exceprions. Method DOES NOT catch exceptions.
+    Records duration of every call by endpoint and status
+    and profiles slow calls when sampling profiler is enabled
     Returns:
         Function response
     Raises:
@@ -25,25 +45,195 @@ def logger_exception(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.time()
+        start_counter = time.perf_counter()
+        token = profiler.begin(func.__name__)
+        status = 500
         try:
-            return func(*args, **kwargs)
-        except Exception:
+            response = func(*args, **kwargs)
+            status = _status(response)
+            return response
+        except Exception as e:
+            # HTTP exceptions have status code
+            status = getattr(e, 'code', 500)
             text = __get_start_data(start_time, func)
             logger.exception('FUNCTION ERROR:\n' + text + 'Exception:\n')  # Logging start params
             raise
+        finally:
+            duration = time.perf_counter() - start_counter
+            request_duration.observe(duration, func.__name__, status)
+            profiler.end(token, duration)
     return wrapper
 
 
-def tokenize(text):
+def clean_tokens(tokens):
+    """
+    Generator. Yields lowercased tokens without punctuation
+    :param tokens: iterable of tokens
+    """
+    for token in tokens:
+        token = token.lower()
+        token = token.strip()
+        token = token.strip('_')
+
+        if all(char in PUNCTUATION for char in token):
+            continue
+
+        yield token
+
+
+def tokenize(text, word_tokenize=None):
+    """
+    Generator. Yields tokens from text
+    :param text: string
+    :param word_tokenize: function that splits sentence to tokens,
+     NLTK word tokenizer by default
+    """
+    word_tokenize = word_tokenize or resources.word_tokenize
     # break the document into sentences
-    for sent in sent_tokenize(text):
+    for sent in resources.sent_tokenize(text):
         # break the sentence into part of speech tagged tokens(words)
-        for token in word_tokenize(sent):
-            token = token.lower()
-            token = token.strip()
-            token = token.strip('_')
+        yield from clean_tokens(word_tokenize(sent))
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with bounded number of entries.
+    Counts hits, misses and evictions.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get cached value and mark it as recently used
+        :param key: hashable key
+        :param default: value returned on miss
+        :return: cached value or default
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Cache value, evict least recently used entries when cache is full
+        :param key: hashable key
+        :param value: value
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """
+        Cache statistics
+        :return: dict
+        """
+        requests = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / requests if requests else 0.0,
+        }
 
-            if all(char in set(string.punctuation) for char in token):
-                continue
 
-            yield token
\ No newline at end of file
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Parse JSON read from stream. Items of top-level array are parsed one by one
+    from chunks of stream, so memory is bounded by the biggest item instead of
+    the whole body. Other JSON values are parsed whole.
+    :param stream: binary file-like object of UTF-8 JSON
+    :param chunk_size: int number of bytes read at once
+    :return: iterator of parsed values, invalid rest of array is one None item
+    :raises ValueError: when body is not JSON array and not valid JSON
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def read(size):
+        # add at least size characters to not parsed part of buffer, unless stream ended
+        nonlocal buffer, pos, eof
+        parts = [buffer[pos:]]
+        length = target = len(parts[0])
+        target += size
+        while length < target and not eof:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            parts.append(decoder.decode(chunk, final=eof))
+            length += len(parts[-1])
+        buffer, pos = ''.join(parts), 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return
+            read(chunk_size)
+
+    def items():
+        nonlocal pos
+        pos += 1
+        try:
+            skip_whitespace()
+            if buffer.startswith(']', pos):
+                return
+            while True:
+                try:
+                    item, end = json_decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    item, end = None, None
+                # number at end of buffer can continue in next chunk
+                if (end is None or not buffer.startswith(ITEM_ENDS, end)) and not eof:
+                    # grow buffer exponentially, so big items are parsed a few times
+                    read(max(len(buffer) - pos, chunk_size))
+                    continue
+                if end is None:
+                    yield None
+                    return
+                yield item
+                pos = end
+                skip_whitespace()
+                if buffer.startswith(']', pos):
+                    return
+                if not buffer.startswith(',', pos):
+                    yield None
+                    return
+                pos += 1
+                skip_whitespace()
+        except ValueError:
+            # not UTF-8
+            yield None
+
+    skip_whitespace()
+    if buffer.startswith('[', pos):
+        return items()
+    while not eof:
+        read(chunk_size)
+    return iter([json.loads(buffer[pos:])])